@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from typing import Dict, Any, Optional
+import asyncio
+import json
 import logging
 
 from ..models.schemas import (
@@ -8,9 +10,16 @@ from ..models.schemas import (
     ErrorResponse, WorkflowStatus
 )
 from ..services.workflow_service import WorkflowService
+from ..services.warmup_service import WarmupService
+from ..services.blob_store import blob_store
+from ..services.graph_view_service import GraphViewService
+from ..services.hedging import hedge_controller
+from ..utils.config import settings
 
 router = APIRouter()
-workflow_service = WorkflowService()
+warmup_service = WarmupService()
+graph_view_service = GraphViewService(warmup_service)
+workflow_service = WorkflowService(graph_view_service)
 logger = logging.getLogger(__name__)
 
 
@@ -23,6 +32,26 @@ async def start_workflow(request: PRDataRequest, background_tasks: BackgroundTas
     Returns a workflow ID that can be used to poll for status updates.
     """
     try:
+        # Reject when the token backlog could not be served within workflow_timeout
+        retry_after = await workflow_service.admission_retry_after()
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail=f"LLM token budget exhausted, retry in {retry_after}s",
+                headers={"Retry-After": str(retry_after)}
+            )
+        
+        # A re-review diffs against a finished prior workflow
+        if request.previous_workflow_id:
+            previous = workflow_service.get_workflow(request.previous_workflow_id)
+            if not previous:
+                raise HTTPException(status_code=404, detail=f"Workflow {request.previous_workflow_id} not found")
+            if previous.status in [WorkflowStatus.PENDING, WorkflowStatus.RUNNING]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Workflow {request.previous_workflow_id} is still {previous.status.value}"
+                )
+        
         # Create new workflow
         workflow_id = workflow_service.create_workflow(request)
         
@@ -37,6 +66,8 @@ async def start_workflow(request: PRDataRequest, background_tasks: BackgroundTas
             "status_endpoint": f"/api/workflow/{workflow_id}/status"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to start workflow: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to start workflow: {str(e)}")
@@ -51,12 +82,13 @@ async def get_workflow_status(workflow_id: str):
     Use this for polling to track workflow progress.
     """
     try:
-        status_data = workflow_service.get_workflow_status(workflow_id)
+        payload = workflow_service.get_workflow_status_bytes(workflow_id)
         
-        if not status_data:
+        if payload is None:
             raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
         
-        return WorkflowStatusResponse(**status_data)
+        # Pre-serialized per workflow version; the schema above documents its shape
+        return Response(content=payload, media_type="application/json")
         
     except HTTPException:
         raise
@@ -65,6 +97,37 @@ async def get_workflow_status(workflow_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get workflow status: {str(e)}")
 
 
+@router.get("/workflow/{workflow_id}/stream")
+async def stream_workflow_status(workflow_id: str):
+    """
+    Stream workflow status updates as server-sent events.
+    
+    An event is emitted whenever the workflow changes, including each chunk of
+    streamed agent output appended to the running step's partial_result.
+    The stream ends when the workflow reaches a terminal status.
+    """
+    if not workflow_service.get_workflow(workflow_id):
+        raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+    
+    terminal_statuses = [WorkflowStatus.COMPLETED, WorkflowStatus.HUMAN_REVIEW_REQUIRED, WorkflowStatus.FAILED]
+    
+    async def event_generator():
+        last_version = None
+        while True:
+            workflow = workflow_service.get_workflow(workflow_id)
+            if not workflow:
+                break
+            if workflow.version != last_version:
+                last_version = workflow.version
+                payload = workflow_service.get_workflow_status_bytes(workflow_id)
+                yield b"data: " + payload + b"\n\n"
+            if workflow.status in terminal_statuses:
+                break
+            await asyncio.sleep(settings.status_stream_interval)
+    
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
 @router.get("/workflow/{workflow_id}/result", response_model=WorkflowResponse)
 async def get_workflow_result(workflow_id: str):
     """
@@ -79,19 +142,14 @@ async def get_workflow_result(workflow_id: str):
         if not workflow:
             raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
         
-        if workflow["status"] not in [WorkflowStatus.COMPLETED, WorkflowStatus.HUMAN_REVIEW_REQUIRED, WorkflowStatus.FAILED]:
+        if workflow.status not in [WorkflowStatus.COMPLETED, WorkflowStatus.HUMAN_REVIEW_REQUIRED, WorkflowStatus.FAILED]:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Workflow {workflow_id} is not completed yet. Current status: {workflow['status']}"
+                detail=f"Workflow {workflow_id} is not completed yet. Current status: {workflow.status}"
             )
         
         # Build the complete response
-        from ..services.workflow_service import WorkflowService
-        temp_service = WorkflowService()
-        temp_service.active_workflows[workflow_id] = workflow
-        
-        result = temp_service._build_workflow_response(workflow_id, None)
-        return result
+        return workflow_service._build_workflow_response(workflow_id, None)
         
     except HTTPException:
         raise
@@ -116,10 +174,10 @@ async def get_workflow_steps(workflow_id: str):
         
         return {
             "workflow_id": workflow_id,
-            "steps": workflow["steps"],
-            "total_steps": len(workflow["steps"]),
-            "completed_steps": len([step for step in workflow["steps"] if step.status == WorkflowStatus.COMPLETED]),
-            "failed_steps": len([step for step in workflow["steps"] if step.status == WorkflowStatus.FAILED])
+            "steps": workflow.steps,
+            "total_steps": len(workflow.steps),
+            "completed_steps": len([step for step in workflow.steps if step.status == WorkflowStatus.COMPLETED]),
+            "failed_steps": len([step for step in workflow.steps if step.status == WorkflowStatus.FAILED])
         }
         
     except HTTPException:
@@ -142,10 +200,10 @@ async def cancel_workflow(workflow_id: str):
         if not workflow:
             raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
         
-        if workflow["status"] not in [WorkflowStatus.PENDING, WorkflowStatus.RUNNING]:
+        if workflow.status not in [WorkflowStatus.PENDING, WorkflowStatus.RUNNING]:
             raise HTTPException(
                 status_code=400, 
-                detail=f"Cannot cancel workflow {workflow_id}. Current status: {workflow['status']}"
+                detail=f"Cannot cancel workflow {workflow_id}. Current status: {workflow.status}"
             )
         
         # In a real implementation, you would implement proper cancellation
@@ -164,6 +222,159 @@ async def cancel_workflow(workflow_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to cancel workflow: {str(e)}")
 
 
+@router.get("/workflow/{workflow_id}/graph")
+async def get_workflow_graph(
+    workflow_id: str,
+    hops: Optional[int] = Query(default=None, ge=0, le=5),
+    max_nodes: Optional[int] = Query(default=None, ge=1)
+):
+    """
+    Get a bounded knowledge-graph view for a workflow.
+    
+    Returns the k-hop neighborhood around the functions changed by the PR in
+    full detail; all other nodes are collapsed into module-level super-nodes
+    that can be expanded page by page with /graph/modules/{module}.
+    """
+    try:
+        workflow = workflow_service.get_workflow(workflow_id)
+        if not workflow:
+            raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+        
+        with workflow_service.profile_span(workflow_id, "graph_query", lane="requests", view="subgraph"):
+            return await graph_view_service.get_subgraph(workflow.request, hops=hops, max_nodes=max_nodes)
+        
+    except HTTPException:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"PR data not found: {str(e)}")
+    except Exception as e:
+        logger.error(f"Failed to get workflow graph: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get workflow graph: {str(e)}")
+
+
+@router.get("/workflow/{workflow_id}/graph/modules/{module}")
+async def expand_workflow_graph_module(
+    workflow_id: str,
+    module: str,
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1)
+):
+    """
+    Expand a collapsed module super-node of the workflow graph.
+    
+    Returns one page of the module's functions and classes with their edges,
+    plus `next_offset` for fetching the next page.
+    """
+    try:
+        workflow = workflow_service.get_workflow(workflow_id)
+        if not workflow:
+            raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+        
+        with workflow_service.profile_span(workflow_id, "graph_query", lane="requests", view="module", module=module):
+            return await graph_view_service.expand_module(workflow.request, module, offset=offset, limit=limit)
+        
+    except HTTPException:
+        raise
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Module {module} not found in graph")
+    except Exception as e:
+        logger.error(f"Failed to expand graph module: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to expand graph module: {str(e)}")
+
+
+@router.get("/workflow/{workflow_id}/profile")
+async def get_workflow_profile(
+    workflow_id: str,
+    format: str = Query(default="speedscope", description="speedscope, folded or timeline")
+):
+    """
+    Download the profile of a workflow started with profile=true.
+    
+    "speedscope" is a speedscope.app file with the sampled stacks and the span
+    timeline, "folded" are collapsed stacks for flamegraph.pl/inferno, and
+    "timeline" lists the spans with per-name totals. A running workflow
+    returns its profile so far.
+    """
+    try:
+        workflow = workflow_service.get_workflow(workflow_id)
+        if not workflow:
+            raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} not found")
+        profiler = workflow.profiler
+        if profiler is None:
+            raise HTTPException(status_code=404, detail=f"Workflow {workflow_id} was not started with profile=true")
+        
+        if format == "speedscope":
+            return Response(
+                content=json.dumps(profiler.to_speedscope()),
+                media_type="application/json",
+                headers={"Content-Disposition": f'attachment; filename="workflow-{workflow_id}.speedscope.json"'}
+            )
+        if format == "folded":
+            return Response(
+                content=profiler.to_collapsed(),
+                media_type="text/plain",
+                headers={"Content-Disposition": f'attachment; filename="workflow-{workflow_id}.folded"'}
+            )
+        if format == "timeline":
+            return {
+                "workflow_id": workflow_id,
+                "spans": profiler.timeline(),
+                "summary": profiler.span_summary(),
+                "samples": len(profiler.samples)
+            }
+        raise HTTPException(status_code=400, detail=f"Unknown profile format: {format}")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get workflow profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get workflow profile: {str(e)}")
+
+
+@router.get("/blobs/{digest}")
+async def get_blob(digest: str, range_header: Optional[str] = Header(default=None, alias="Range")):
+    """
+    Get the full value of an offloaded step result field.
+    
+    Large step result fields are returned inline as references; this endpoint
+    serves the referenced JSON and supports single byte ranges
+    (e.g. `Range: bytes=0-1023`).
+    """
+    try:
+        if not blob_store.exists(digest):
+            raise HTTPException(status_code=404, detail=f"Blob {digest} not found")
+        
+        size = blob_store.size(digest)
+        headers = {"Accept-Ranges": "bytes", "Cache-Control": "public, max-age=31536000, immutable"}
+        if not range_header:
+            return Response(content=blob_store.read(digest), media_type="application/json", headers=headers)
+        
+        units, _, spec = range_header.partition("=")
+        start_text, _, end_text = spec.partition("-")
+        if units.strip() != "bytes" or "," in spec or not (start_text or end_text):
+            raise HTTPException(status_code=416, detail=f"Unsupported range: {range_header}")
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            # suffix range: the last N bytes
+            start, end = max(0, size - int(end_text)), size - 1
+        if start > end or start >= size:
+            raise HTTPException(status_code=416, detail=f"Range not satisfiable: {range_header}")
+        
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(content=blob_store.read(digest, start, end), status_code=206,
+                        media_type="application/json", headers=headers)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get blob: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get blob: {str(e)}")
+
+
 @router.get("/workflows")
 async def list_workflows():
     """
@@ -176,10 +387,10 @@ async def list_workflows():
         for workflow_id, workflow_data in workflow_service.active_workflows.items():
             workflows.append({
                 "workflow_id": workflow_id,
-                "status": workflow_data["status"],
-                "created_at": workflow_data["created_at"],
-                "updated_at": workflow_data["updated_at"],
-                "human_review_required": workflow_data["human_review_required"]
+                "status": workflow_data.status,
+                "created_at": workflow_data.created_at,
+                "updated_at": workflow_data.updated_at,
+                "human_review_required": workflow_data.human_review_required
             })
         
         return {
@@ -192,6 +403,17 @@ async def list_workflows():
         raise HTTPException(status_code=500, detail=f"Failed to list workflows: {str(e)}")
 
 
+@router.get("/stats/hedging")
+async def get_hedging_stats():
+    """
+    Hedged LLM call statistics.
+    
+    Per step/model: requests, hedge rate, which attempt won, deadline misses,
+    latency percentiles and the current hedge threshold.
+    """
+    return hedge_controller.stats()
+
+
 @router.get("/health")
 async def health_check():
     """
@@ -203,4 +425,16 @@ async def health_check():
         "status": "healthy",
         "service": "code-review-agent-api",
         "version": "1.0.0"
-    } 
\ No newline at end of file
+    } 
+
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Readiness endpoint.
+    
+    Unlike /health, this only returns 200 once the warm-up phase has preloaded
+    the configured graphs, routing examples and LLM client.
+    """
+    readiness = warmup_service.get_readiness()
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
@@ -1,16 +1,24 @@
+import time
+
+_import_start = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import logging
 import uvicorn
 
-from .api.routes import router as api_router
+from .api.routes import router as api_router, warmup_service
+from .utils.config import settings
+from .utils.log_queue import setup_queue_logging, shutdown_queue_logging
+from .utils.pipeline import import_pipeline_module
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+import_time = time.perf_counter() - _import_start
+
+# Configure logging: records are queued and written by a listener thread so
+# log I/O never blocks request handling
+setup_queue_logging()
 
 # Create FastAPI app
 app = FastAPI(
@@ -34,6 +42,36 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api", tags=["workflow"])
 
 
+@app.on_event("startup")
+async def startup_warmup():
+    """Report import time and start warming up in the background."""
+    logging.info(f"Application modules imported in {import_time:.2f}s")
+    if settings.llm_cassette_mode != "off":
+        if not settings.llm_cassette_path:
+            raise RuntimeError(
+                f"llm_cassette_mode is '{settings.llm_cassette_mode}' but llm_cassette_path is not set"
+            )
+        llm_cassette = import_pipeline_module("llm_cassette")
+        cassette = llm_cassette.install(
+            settings.llm_cassette_path, settings.llm_cassette_mode, settings.llm_replay_latency
+        )
+        logging.info(f"LLM cassette {cassette.path} active in {cassette.mode} mode")
+    if settings.warmup_on_startup:
+        app.state.warmup_task = asyncio.create_task(warmup_service.warm_up())
+    else:
+        warmup_service.skip()
+
+
+@app.on_event("shutdown")
+async def flush_logs():
+    """Close the LLM cassette and drain the log queue before the process exits."""
+    if settings.llm_cassette_mode != "off":
+        cassette = import_pipeline_module("llm_cassette").uninstall()
+        if cassette:
+            logging.info(f"LLM cassette stats: {cassette.stats()}")
+    shutdown_queue_logging()
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -41,7 +79,8 @@ async def root():
         "message": "Code Review Agent API",
         "version": "1.0.0",
         "docs": "/docs",
-        "health": "/api/health"
+        "health": "/api/health",
+        "ready": "/api/ready"
     }
 
 
@@ -50,7 +89,8 @@ async def http_exception_handler(request, exc):
     """Global exception handler for HTTP exceptions."""
     return JSONResponse(
         status_code=exc.status_code,
-        content={"error": exc.detail}
+        content={"error": exc.detail},
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -0,0 +1,89 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+from .schemas import WorkflowStatus, WorkflowStepResult
+
+
+def _iso(wall_time: float) -> str:
+    return datetime.utcfromtimestamp(wall_time).isoformat()
+
+
+@dataclass
+class WorkflowRecord:
+    """
+    Internal state of one workflow.
+
+    Timestamps are monotonic; wall-clock ISO strings are derived from the
+    creation time only when a response is built. `version` is bumped on every
+    change so serialized status payloads can be cached per version.
+    """
+    __slots__ = (
+        "id", "request", "status", "steps", "human_review_required", "final_result",
+        "total_execution_time", "created_wall", "created_mono", "updated_mono",
+        "version", "status_cache", "profiler", "patch", "rereview", "deadline",
+    )
+
+    id: str
+    request: Dict[str, Any]
+    status: WorkflowStatus
+    steps: List[WorkflowStepResult]
+    human_review_required: bool
+    final_result: Optional[Dict[str, Any]]
+    total_execution_time: Optional[float]
+    created_wall: float
+    created_mono: float
+    updated_mono: float
+    version: int
+    status_cache: Optional[Tuple[int, bytes]]
+    profiler: Optional[Any]
+    # patch text as reviewed, kept so a later re-review can diff against it
+    patch: Optional[str]
+    rereview: Optional[Any]
+    # monotonic time by which the workflow should finish
+    deadline: Optional[float]
+
+    @classmethod
+    def create(cls, workflow_id: str, request: Dict[str, Any]) -> "WorkflowRecord":
+        now = time.monotonic()
+        return cls(
+            id=workflow_id,
+            request=request,
+            status=WorkflowStatus.PENDING,
+            steps=[],
+            human_review_required=False,
+            final_result=None,
+            total_execution_time=None,
+            created_wall=time.time(),
+            created_mono=now,
+            updated_mono=now,
+            version=0,
+            status_cache=None,
+            profiler=None,
+            patch=None,
+            rereview=None,
+            deadline=None,
+        )
+
+    def touch(self):
+        """Record a change: bump the version and the update time."""
+        self.version += 1
+        self.updated_mono = time.monotonic()
+
+    @property
+    def created_at(self) -> str:
+        return _iso(self.created_wall)
+
+    @property
+    def updated_at(self) -> str:
+        return _iso(self.created_wall + (self.updated_mono - self.created_mono))
+
+    def cached_status(self) -> Optional[bytes]:
+        """Serialized status for the current version, if already built."""
+        if self.status_cache is not None and self.status_cache[0] == self.version:
+            return self.status_cache[1]
+        return None
+
+    def cache_status(self, payload: bytes):
+        self.status_cache = (self.version, payload)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List, Dict, Any
 from enum import Enum
 
@@ -31,6 +31,8 @@ class PRDataRequest(BaseModel):
     update_deps_graph: bool = Field(default=False, description="Update the dependencies graph")
     update_kd_graph: bool = Field(default=False, description="Update the knowledge graph")
     verbose: bool = Field(default=True, description="Enable verbose output")
+    profile: bool = Field(default=False, description="Capture a sampling profile and span timeline of the workflow")
+    previous_workflow_id: Optional[str] = Field(default=None, description="Re-review only what changed since this workflow")
 
 
 class RoutingResult(BaseModel):
@@ -57,9 +59,21 @@ class TestGenerationResult(BaseModel):
 
 
 class WorkflowStepResult(BaseModel):
+    # model/model_tier name the LLM that answered, not pydantic attributes
+    model_config = ConfigDict(protected_namespaces=())
+
     step: WorkflowStep
     status: WorkflowStatus
     result: Optional[Dict[str, Any]] = None
+    partial_result: Optional[str] = None
+    tokens_received: Optional[int] = None
+    expected_tokens: Optional[int] = None
+    model: Optional[str] = None
+    model_tier: Optional[int] = None
+    escalated: Optional[bool] = None
+    reused_from: Optional[str] = None
+    hedged: Optional[bool] = None
+    hedge_won: Optional[bool] = None
     error: Optional[str] = None
     execution_time: Optional[float] = None
 
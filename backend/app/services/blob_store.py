@@ -0,0 +1,115 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from ..utils.config import settings
+
+BLOB_REF_KEY = "blob_ref"
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """Content-addressed, gzip-compressed JSON blobs on local disk."""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.logger = logging.getLogger(__name__)
+
+    def _path(self, digest: str) -> str:
+        if not _DIGEST_RE.match(digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+        return os.path.join(self.root_dir, digest[:2], f"{digest}.json.gz")
+
+    def put(self, value: Any) -> Tuple[str, int]:
+        """Store a JSON-serializable value and return (digest, uncompressed size)."""
+        data = json.dumps(value, separators=(",", ":"), sort_keys=True, default=str).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest, len(data)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def size(self, digest: str) -> int:
+        """Uncompressed size, read from the gzip trailer (ISIZE, modulo 2**32)."""
+        with open(self._path(digest), "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), "little")
+
+    def read(self, digest: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Read the uncompressed bytes [start, end] (inclusive) of a blob."""
+        with gzip.open(self._path(digest), "rb") as f:
+            if start:
+                f.seek(start)
+            if end is None:
+                return f.read()
+            return f.read(max(0, end - start + 1))
+
+    def load(self, digest: str) -> Any:
+        return json.loads(self.read(digest))
+
+
+def summarize(value: Any) -> Dict[str, Any]:
+    """Small inline stand-in for an offloaded value."""
+    if isinstance(value, list):
+        return {"type": "list", "length": len(value)}
+    if isinstance(value, dict):
+        keys = list(value.keys())
+        return {"type": "dict", "keys": keys[:20], "num_keys": len(keys)}
+    if isinstance(value, str):
+        return {"type": "str", "length": len(value), "preview": value[:200]}
+    return {"type": type(value).__name__}
+
+
+def offload_large_fields(blob_store: BlobStore, result: Optional[Dict[str, Any]],
+                         max_inline_bytes: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Replace top-level fields larger than `max_inline_bytes` with blob references.
+
+    A reference keeps a summary inline and points to the full value at
+    /api/blobs/{digest}.
+    """
+    if not result:
+        return result
+    limit = settings.blob_inline_max_bytes if max_inline_bytes is None else max_inline_bytes
+
+    offloaded = {}
+    for key, value in result.items():
+        if isinstance(value, dict) and BLOB_REF_KEY in value:
+            offloaded[key] = value
+            continue
+        size = len(json.dumps(value, separators=(",", ":"), default=str))
+        if size <= limit:
+            offloaded[key] = value
+            continue
+        digest, size = blob_store.put(value)
+        offloaded[key] = {
+            BLOB_REF_KEY: digest,
+            "size": size,
+            "summary": summarize(value),
+            "url": f"/api/blobs/{digest}",
+        }
+    return offloaded
+
+
+def inline_offloaded_fields(blob_store: BlobStore, result: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Inverse of offload_large_fields: replace blob references with their values."""
+    if not result:
+        return result
+    return {
+        key: blob_store.load(value[BLOB_REF_KEY]) if isinstance(value, dict) and BLOB_REF_KEY in value else value
+        for key, value in result.items()
+    }
+
+
+blob_store = BlobStore(settings.blob_store_dir)
@@ -0,0 +1,272 @@
+import asyncio
+import os
+import threading
+from argparse import Namespace
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Optional, Set, Tuple
+import logging
+
+from ..utils.config import settings
+from ..utils.pipeline import import_pipeline_module, resolve_pipeline_path
+from .rereview import parse_hunks
+
+NEIGHBOR_EDGE_TYPES = ("calls", "inherits")
+
+
+def parse_patch_changes(patch: str) -> Dict[str, List[Tuple[int, int]]]:
+    """Map each file touched by a unified diff to the new-side line ranges of its hunks."""
+    changes: Dict[str, List[Tuple[int, int]]] = {}
+    for path, hunks in parse_hunks(patch).items():
+        # hunks of deleted files have no new side
+        ranges = [(hunk.new_start, hunk.new_end) for hunk in hunks if hunk.new_start > 0]
+        if ranges:
+            changes[path] = ranges
+    return changes
+
+
+def changed_node_ids(graph_data: Dict[str, Any], changes: Dict[str, List[Tuple[int, int]]]) -> List[str]:
+    """Innermost functions/classes whose line span overlaps a changed hunk."""
+    by_file = defaultdict(list)
+    for node in graph_data["nodes"]:
+        if node.get("type") in ("function", "class") and node.get("file"):
+            by_file[node["file"].replace(os.sep, "/")].append(node)
+
+    seeds = []
+    for path, ranges in changes.items():
+        candidates = [n for file, nodes in by_file.items()
+                      if path == file or path.endswith("/" + file) for n in nodes]
+        for start, end in ranges:
+            overlapping = [n for n in candidates
+                           if n["lineno"] <= end and (n.get("end_lineno") or n["lineno"]) >= start]
+            if overlapping:
+                # the innermost definition is the one that starts last
+                innermost = max(overlapping, key=lambda n: n["lineno"])
+                if innermost["id"] not in seeds:
+                    seeds.append(innermost["id"])
+    return seeds
+
+
+def read_request_patch(request: Dict[str, Any]) -> str:
+    """The patch file that belongs to a workflow request's problem statement."""
+    patch_file = resolve_pipeline_path(request["input_file"].replace("problem_statement", "patch"))
+    with open(patch_file, "r") as f:
+        return f.read()
+
+
+class GraphView:
+    """Indexed code graph of one repo, able to cut bounded level-of-detail views."""
+
+    def __init__(self, graph_data: Dict[str, Any], centrality: Optional[Any] = None):
+        self.nodes = {node["id"]: node for node in graph_data["nodes"]}
+        self.graph_data = graph_data
+        # precomputed PageRank of this graph snapshot, loaded on first use
+        self.centrality = centrality
+        self.neighbors: Dict[str, Set[str]] = defaultdict(set)
+        self.module_of: Dict[str, str] = {}
+        self.module_members: Dict[str, List[str]] = defaultdict(list)
+
+        module_by_file = {n["file"]: n["id"] for n in graph_data["nodes"] if n.get("type") == "module"}
+        for node_id, node in self.nodes.items():
+            if node.get("type") == "module":
+                continue
+            module = module_by_file.get(node.get("file"), node_id.rsplit(".", 1)[0])
+            self.module_of[node_id] = module
+            self.module_members[module].append(node_id)
+
+        self.edges = [e for e in graph_data["edges"] if e.get("type") in NEIGHBOR_EDGE_TYPES]
+        for edge in self.edges:
+            self.neighbors[edge["source"]].add(edge["target"])
+            self.neighbors[edge["target"]].add(edge["source"])
+
+    def neighborhood(self, seeds: List[str], hops: int, max_nodes: int) -> Dict[str, int]:
+        """Breadth-first k-hop neighborhood (ignoring direction), capped at max_nodes."""
+        distance = {}
+        queue = deque()
+        for seed in seeds:
+            if seed in self.nodes and seed not in distance:
+                distance[seed] = 0
+                queue.append(seed)
+        while queue and len(distance) < max_nodes:
+            node_id = queue.popleft()
+            if distance[node_id] >= hops:
+                continue
+            # visit well-connected neighbors first so the cap keeps the most useful ones
+            for neighbor in sorted(self.neighbors[node_id], key=lambda n: -len(self.neighbors[n])):
+                if neighbor not in distance:
+                    distance[neighbor] = distance[node_id] + 1
+                    queue.append(neighbor)
+                    if len(distance) >= max_nodes:
+                        break
+        return distance
+
+    def _node_payload(self, node_id: str, **extra) -> Dict[str, Any]:
+        node = self.nodes[node_id]
+        payload = {"id": node_id, "label": node.get("label", node_id), "type": node.get("type")}
+        for key in ("file", "lineno"):
+            if key in node:
+                payload[key] = node[key]
+        payload.update(extra)
+        return payload
+
+    def level_of_detail(self, seeds: List[str], hops: int, max_nodes: int) -> Dict[str, Any]:
+        """
+        Detailed k-hop neighborhood around the seeds; every other node is folded
+        into a super-node for its module, with edges aggregated and weighted.
+        """
+        distance = self.neighborhood(seeds, hops, max_nodes)
+
+        def visible(node_id: str) -> Optional[str]:
+            if node_id in distance:
+                return node_id
+            return self.module_of.get(node_id)
+
+        nodes = [self._node_payload(node_id, hop=hop, seed=hop == 0) for node_id, hop in distance.items()]
+        collapsed = defaultdict(int)
+        for module, members in self.module_members.items():
+            hidden = sum(1 for member in members if member not in distance)
+            if hidden:
+                collapsed[module] = hidden
+
+        edge_weights: Dict[Tuple[str, str], int] = defaultdict(int)
+        for edge in self.edges:
+            source, target = visible(edge["source"]), visible(edge["target"])
+            if source and target and source != target:
+                edge_weights[(source, target)] += 1
+
+        # only keep super-nodes that connect to the detailed part of the view
+        connected = {s for (s, t) in edge_weights if t in distance} | {t for (s, t) in edge_weights if s in distance}
+        for module, hidden in collapsed.items():
+            if module in connected:
+                nodes.append({"id": module, "label": module, "type": "module", "collapsed": True, "size": hidden})
+        shown = {node["id"] for node in nodes}
+        edges = [{"source": s, "target": t, "weight": w}
+                 for (s, t), w in edge_weights.items() if s in shown and t in shown]
+
+        return {
+            "directed": True,
+            "nodes": nodes,
+            "edges": edges,
+            "seeds": [seed for seed in seeds if seed in self.nodes],
+            "hops": hops,
+            "truncated": len(distance) >= max_nodes,
+            "total_nodes": len(self.nodes),
+            "total_edges": len(self.edges),
+        }
+
+    def expand_module(self, module: str, offset: int, limit: int) -> Dict[str, Any]:
+        """One page of the members of a collapsed module and the edges between them and others."""
+        members = self.module_members.get(module)
+        if members is None:
+            raise KeyError(module)
+        page = members[offset:offset + limit]
+        page_ids = set(page)
+        edges = [{"source": e["source"], "target": e["target"], "type": e["type"]}
+                 for e in self.edges if e["source"] in page_ids or e["target"] in page_ids]
+        return {
+            "module": module,
+            "nodes": [self._node_payload(node_id) for node_id in page],
+            "edges": edges,
+            "offset": offset,
+            "limit": limit,
+            "total": len(members),
+            "next_offset": offset + limit if offset + limit < len(members) else None,
+        }
+
+
+class GraphViewService:
+    """Serves bounded knowledge-graph views for workflows."""
+
+    def __init__(self, warmup_service=None):
+        self.logger = logging.getLogger(__name__)
+        self.warmup_service = warmup_service
+        self._views: Dict[Tuple[str, str, str], GraphView] = {}
+        # views are loaded from executor threads; one build at a time per repo/module
+        self._lock = threading.Lock()
+        self._build_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def _repo_args(self, request: Dict[str, Any]) -> Namespace:
+        return Namespace(repo_root=resolve_pipeline_path(request["repo_root"]),
+                         repo_path=resolve_pipeline_path(request["repo_path"]),
+                         module_path=request.get("module_path", ""), logger=self.logger)
+
+    def _load_view(self, request: Dict[str, Any]) -> GraphView:
+        """Graph view of the repo as currently checked out; views of older commits are dropped."""
+        repo_path = resolve_pipeline_path(request["repo_path"])
+        module_path = request.get("module_path", "")
+        commit = import_pipeline_module("lexical_index").get_repo_commit(repo_path)
+        key = (repo_path, module_path, commit)
+        with self._lock:
+            view = self._views.get(key)
+            build_lock = self._build_locks.setdefault(key[:2], threading.Lock())
+        if view is not None:
+            return view
+
+        with build_lock:
+            with self._lock:
+                view = self._views.get(key)
+            if view is not None:
+                return view
+            graph_data, centrality = None, None
+            if self.warmup_service is not None:
+                preloaded = self.warmup_service.code_graphs.get(key)
+                graph_data = preloaded[0] if preloaded else None
+                centrality = self.warmup_service.centralities.get(key)
+            if graph_data is None:
+                graph_extraction = import_pipeline_module("graph_extraction")
+                graph_data, _ = graph_extraction.build_code_graph(self._repo_args(request))
+            view = GraphView(graph_data, centrality)
+            with self._lock:
+                for stale in [k for k in self._views if k[:2] == key[:2]]:
+                    self._views.pop(stale, None)
+                self._views[key] = view
+        return view
+
+    def _build_subgraph(self, request: Dict[str, Any], hops: int, max_nodes: int) -> Dict[str, Any]:
+        view = self._load_view(request)
+        seeds = changed_node_ids(view.graph_data, parse_patch_changes(read_request_patch(request)))
+        return view.level_of_detail(seeds, hops, max_nodes)
+
+    def _changed_neighborhood(self, request: Dict[str, Any], changes: Dict[str, List[Tuple[int, int]]],
+                              hops: int) -> List[str]:
+        view = self._load_view(request)
+        seeds = changed_node_ids(view.graph_data, changes)
+        return list(view.neighborhood(seeds, hops, settings.graph_view_max_nodes))
+
+    def _centrality_scores(self, request: Dict[str, Any], changes: Dict[str, List[Tuple[int, int]]],
+                           hops: int) -> Dict[str, float]:
+        view = self._load_view(request)
+        if view.centrality is None:
+            graph_centrality = import_pipeline_module("graph_centrality")
+            view.centrality = graph_centrality.get_centrality(self._repo_args(request), view.graph_data)
+        seeds = changed_node_ids(view.graph_data, changes)
+        return {node_id: view.centrality.score(node_id)
+                for node_id in view.neighborhood(seeds, hops, settings.graph_view_max_nodes)}
+
+    async def get_subgraph(self, request: Dict[str, Any], hops: Optional[int] = None,
+                           max_nodes: Optional[int] = None) -> Dict[str, Any]:
+        """k-hop view around the PR's changed functions, built off the event loop."""
+        hops = settings.graph_view_default_hops if hops is None else hops
+        max_nodes = min(max_nodes or settings.graph_view_max_nodes, settings.graph_view_max_nodes)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._build_subgraph, request, hops, max_nodes
+        )
+
+    async def changed_neighborhood(self, request: Dict[str, Any], changes: Dict[str, List[Tuple[int, int]]],
+                                   hops: int = 1) -> List[str]:
+        """Ids of the functions/classes overlapping the changed line ranges and their k-hop neighbors."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._changed_neighborhood, request, changes, hops
+        )
+
+    async def centrality_scores(self, request: Dict[str, Any], changes: Dict[str, List[Tuple[int, int]]],
+                                hops: int = 1) -> Dict[str, float]:
+        """Precomputed PageRank of the changed functions/classes and their k-hop neighbors."""
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._centrality_scores, request, changes, hops
+        )
+
+    async def expand_module(self, request: Dict[str, Any], module: str, offset: int = 0,
+                            limit: Optional[int] = None) -> Dict[str, Any]:
+        limit = min(limit or settings.graph_view_page_size, settings.graph_view_page_size)
+        view = await asyncio.get_running_loop().run_in_executor(None, self._load_view, request)
+        return view.expand_module(module, offset, limit)
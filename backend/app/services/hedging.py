@@ -0,0 +1,152 @@
+import asyncio
+import math
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+import logging
+
+from ..utils.config import settings
+
+
+class StepDeadlineExceeded(Exception):
+    """An LLM call did not finish within its step's latency budget."""
+
+
+@dataclass
+class HedgeOutcome:
+    latency: float
+    hedged: bool = False
+    hedge_won: bool = False
+
+
+class HedgeController:
+    """
+    Hedged, deadline-bounded LLM calls.
+
+    Latencies are tracked per (step, model). When a call is still running
+    after the observed hedge_percentile latency, an identical hedge request is
+    started. The first successful response wins and the other is cancelled.
+    Hedges are capped at hedge_budget times the number of primary requests.
+    """
+
+    def __init__(self, percentile: float, min_samples: int, window: int, budget: float, enabled: bool = True):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.latencies: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.counters: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.primary_total = 0
+        self.hedge_total = 0
+
+    def threshold(self, step: str, model: str) -> Optional[float]:
+        """Observed latency percentile for a step/model, or None until enough calls were seen."""
+        samples = self.latencies[(step, model)]
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)]
+
+    def _take_hedge_budget(self) -> bool:
+        if self.hedge_total + 1 > self.budget * self.primary_total:
+            return False
+        self.hedge_total += 1
+        return True
+
+    async def call(self, step: str, model: str, attempt: Callable[[bool], Awaitable[Any]],
+                   deadline: Optional[float] = None) -> Tuple[Any, HedgeOutcome]:
+        """
+        Run `attempt(is_hedge)` and hedge it if it is slow, until the monotonic `deadline`.
+
+        Raises StepDeadlineExceeded when no attempt succeeds in time.
+        """
+        key = (step, model)
+        counters = self.counters[key]
+        counters["requests"] += 1
+        self.primary_total += 1
+        start_time = time.monotonic()
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+        primary = asyncio.ensure_future(attempt(False))
+        tasks = {primary: start_time}
+        outcome = HedgeOutcome(latency=0.0)
+        try:
+            threshold = self.threshold(step, model) if self.enabled else None
+            if threshold is not None:
+                budget = remaining()
+                done, _ = await asyncio.wait({primary}, timeout=threshold if budget is None else min(threshold, budget))
+                if not done and remaining() != 0 and self._take_hedge_budget():
+                    counters["hedged"] += 1
+                    outcome.hedged = True
+                    tasks[asyncio.ensure_future(attempt(True))] = time.monotonic()
+                    self.logger.info(f"{step}/{model}: no response after {threshold:.1f}s (p{self.percentile:g}), hedging")
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=remaining(), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    counters["deadline_exceeded"] += 1
+                    raise StepDeadlineExceeded(
+                        f"{step} on {model} exceeded its {deadline - start_time:.1f}s budget"
+                    )
+                for task in done:
+                    if task.exception() is not None:
+                        continue  # the other attempt may still succeed
+                    result = task.result()
+                    outcome.latency = time.monotonic() - tasks[task]
+                    outcome.hedge_won = task is not primary
+                    if outcome.hedged:
+                        counters["hedge_wins" if outcome.hedge_won else "primary_wins"] += 1
+                    self.latencies[key].append(outcome.latency)
+                    if outcome.hedge_won:
+                        # the primary took at least this long; recording the lower bound
+                        # keeps the percentile from drifting down when slow calls are cut
+                        self.latencies[key].append(time.monotonic() - start_time)
+                    return result, outcome
+            # every attempt failed: surface the primary's error
+            return primary.result(), outcome
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hedge rate, win rates and latency percentiles per step/model."""
+        report = {}
+        for (step, model), counters in self.counters.items():
+            requests, hedged = counters["requests"], counters["hedged"]
+            samples = sorted(self.latencies[(step, model)])
+
+            def pct(q: float) -> Optional[float]:
+                if not samples:
+                    return None
+                return round(samples[min(len(samples) - 1, math.ceil(q / 100 * len(samples)) - 1)], 3)
+
+            report[f"{step}/{model}"] = {
+                "requests": requests,
+                "hedged": hedged,
+                "hedge_rate": round(hedged / requests, 4) if requests else 0.0,
+                "hedge_wins": counters["hedge_wins"],
+                "primary_wins": counters["primary_wins"],
+                "hedge_win_rate": round(counters["hedge_wins"] / hedged, 4) if hedged else None,
+                "deadline_exceeded": counters["deadline_exceeded"],
+                "p50": pct(50),
+                "p95": pct(95),
+                "hedge_threshold": self.threshold(step, model),
+            }
+        return {
+            "enabled": self.enabled,
+            "budget": self.budget,
+            "budget_used": round(self.hedge_total / self.primary_total, 4) if self.primary_total else 0.0,
+            "steps": report,
+        }
+
+
+hedge_controller = HedgeController(
+    settings.hedge_percentile, settings.hedge_min_samples, settings.hedge_latency_window,
+    settings.hedge_budget, enabled=settings.hedge_enabled
+)
@@ -0,0 +1,263 @@
+import hashlib
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..models.schemas import WorkflowStep, WorkflowStepResult
+
+_HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _strip_prefix(path: str) -> str:
+    return re.sub(r"^[ab]/", "", path.split("\t")[0].strip())
+
+
+@dataclass
+class Hunk:
+    """One hunk of a unified diff; its identity is its content, not its position."""
+    file: str
+    index: int
+    old_start: int
+    old_length: int
+    new_start: int
+    new_length: int
+    lines: List[str]
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1("\n".join([self.file] + self.lines).encode("utf-8")).hexdigest()
+
+    @property
+    def old_end(self) -> int:
+        return self.old_start + max(self.old_length, 1) - 1
+
+    @property
+    def new_end(self) -> int:
+        return self.new_start + max(self.new_length, 1) - 1
+
+    def header(self) -> str:
+        return f"@@ -{self.old_start},{self.old_length} +{self.new_start},{self.new_length} @@"
+
+
+def parse_hunks(patch: str) -> Dict[str, List[Hunk]]:
+    """Hunks of a unified diff per file (new path, or old path for deleted files)."""
+    hunks: Dict[str, List[Hunk]] = defaultdict(list)
+    old_path, current_file = None, None
+    lines = patch.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        if line.startswith("--- "):
+            old_path = _strip_prefix(line[4:])
+        elif line.startswith("+++ "):
+            new_path = _strip_prefix(line[4:])
+            current_file = old_path if new_path == "/dev/null" else new_path
+        elif line.startswith("@@") and current_file:
+            match = _HUNK_RE.match(line)
+            if not match:
+                continue
+            old_length = int(match.group(2)) if match.group(2) is not None else 1
+            new_length = int(match.group(4)) if match.group(4) is not None else 1
+            # consume exactly the lines the header announces, so removed lines
+            # starting with "--" are not mistaken for file headers
+            body, old_left, new_left = [], old_length, new_length
+            while i < len(lines) and (old_left > 0 or new_left > 0 or lines[i].startswith("\\")):
+                body_line = lines[i]
+                i += 1
+                body.append(body_line)
+                if body_line.startswith("-"):
+                    old_left -= 1
+                elif body_line.startswith("+"):
+                    new_left -= 1
+                elif not body_line.startswith("\\"):
+                    old_left -= 1
+                    new_left -= 1
+            hunks[current_file].append(Hunk(
+                current_file, len(hunks[current_file]), int(match.group(1)), old_length,
+                int(match.group(3)), new_length, body
+            ))
+    return dict(hunks)
+
+
+@dataclass
+class PatchDelta:
+    """Hunk-level difference between the prior and the new patch of a PR."""
+    old_hunks: Dict[str, List[Hunk]]
+    new_hunks: Dict[str, List[Hunk]]
+    changed: List[Hunk]
+    removed: List[Hunk]
+    matches: Dict[Tuple[str, int], Hunk]
+
+    @property
+    def same_files(self) -> bool:
+        return set(self.old_hunks) == set(self.new_hunks)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.changed and not self.removed
+
+    @property
+    def unchanged_count(self) -> int:
+        return len(self.matches)
+
+    def changed_ranges(self) -> Dict[str, List[Tuple[int, int]]]:
+        """New-side line ranges of the hunks that have to be reviewed again."""
+        ranges: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for hunk in self.changed:
+            ranges[hunk.file].append((hunk.new_start, hunk.new_end))
+        return dict(ranges)
+
+    def scoped_patch(self) -> str:
+        """A unified diff made of the changed hunks only."""
+        by_file: Dict[str, List[Hunk]] = defaultdict(list)
+        for hunk in self.changed:
+            by_file[hunk.file].append(hunk)
+        parts = []
+        for path, hunks in by_file.items():
+            parts.append(f"--- a/{path}\n+++ b/{path}")
+            for hunk in hunks:
+                parts.append("\n".join([hunk.header()] + hunk.lines))
+        return "\n".join(parts) + ("\n" if parts else "")
+
+    def map_line(self, path: str, line: int) -> Optional[int]:
+        """
+        Map a new-side line of the prior patch to the new patch.
+
+        Returns None when the line belongs to code that changed since, so a
+        finding on it has to be re-derived instead of carried forward.
+        """
+        old_hunks = self.old_hunks.get(path, [])
+        for hunk in old_hunks:
+            if hunk.new_start <= line <= hunk.new_end:
+                match = self.matches.get((path, hunk.index))
+                return None if match is None else line - hunk.new_start + match.new_start
+
+        # both patches apply to the same base; go through base line numbers
+        base = line - sum(h.new_length - h.old_length for h in old_hunks if h.new_end < line)
+        new_hunks = self.new_hunks.get(path, [])
+        for hunk in new_hunks:
+            if hunk.old_start <= base <= hunk.old_end:
+                return None
+        return base + sum(h.new_length - h.old_length for h in new_hunks if h.old_end < base)
+
+
+def compute_delta(old_patch: str, new_patch: str) -> PatchDelta:
+    """Match hunks by content; new hunks without a match are the ones to re-review."""
+    old_hunks, new_hunks = parse_hunks(old_patch), parse_hunks(new_patch)
+    available: Dict[str, List[Hunk]] = defaultdict(list)
+    for hunks in old_hunks.values():
+        for hunk in hunks:
+            available[hunk.digest].append(hunk)
+
+    changed, matches = [], {}
+    for hunks in new_hunks.values():
+        for hunk in hunks:
+            if available[hunk.digest]:
+                old = available[hunk.digest].pop(0)
+                matches[(old.file, old.index)] = hunk
+            else:
+                changed.append(hunk)
+    removed = [hunk for hunks in old_hunks.values() for hunk in hunks if (hunk.file, hunk.index) not in matches]
+    return PatchDelta(old_hunks, new_hunks, changed, removed, matches)
+
+
+@dataclass
+class ReReviewPlan:
+    """What a re-review of a PR can reuse from its prior workflow."""
+    previous_workflow_id: str
+    delta: PatchDelta
+    prior_steps: Dict[WorkflowStep, WorkflowStepResult]
+    scope_nodes: List[str] = field(default_factory=list)
+
+    def reusable_step(self, step: WorkflowStep) -> Optional[WorkflowStepResult]:
+        """
+        The prior result of a step if it still holds for the new patch.
+
+        Routing and architect results depend on the set of touched files; review
+        and test generation are only reused when no hunk changed at all.
+        """
+        prior = self.prior_steps.get(step)
+        if prior is None:
+            return None
+        if step in (WorkflowStep.ROUTING, WorkflowStep.ARCHITECT):
+            return prior if self.delta.same_files else None
+        return prior if self.delta.is_empty else None
+
+    def agent_scope(self, step: WorkflowStep, full_patch: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Input of a re-run review or test generation step.
+
+        Only a step with a prior result to carry forward is narrowed to the
+        changed hunks and their graph neighbors; without one the agent sees the
+        full patch. None means nothing changed that the agent has to look at:
+        hunks were only removed, so the prior result is just carried forward.
+        """
+        if step not in self.prior_steps:
+            return {"patch": full_patch, "scope_nodes": []}
+        if not self.delta.changed:
+            return None
+        return {"patch": self.delta.scoped_patch(), "scope_nodes": self.scope_nodes}
+
+    def carry_forward(self, step: WorkflowStep, prior: Dict[str, Any]) -> Dict[str, Any]:
+        """A step's prior result moved to the new patch, without re-running the agent."""
+        if step == WorkflowStep.REVIEW:
+            return self.merge_review(prior, dict(prior, issues=[], overall_good=True))
+        return self.merge_tests(prior, dict(prior, new_test_cases=[]))
+
+    def summary(self, carried_forward: int = 0) -> Dict[str, Any]:
+        return {
+            "previous_workflow_id": self.previous_workflow_id,
+            "changed_hunks": len(self.delta.changed),
+            "removed_hunks": len(self.delta.removed),
+            "unchanged_hunks": self.delta.unchanged_count,
+            "changed_ranges": self.delta.changed_ranges(),
+            "reviewed_nodes": self.scope_nodes,
+            "carried_forward": carried_forward,
+        }
+
+    def _in_scope(self, function: str) -> bool:
+        return any(node == function or node.endswith("." + function) for node in self.scope_nodes)
+
+    def relocate(self, finding: Any, keep_unlocated: bool = False) -> Optional[Any]:
+        """
+        A prior finding moved to the new patch's line numbers, or None when it
+        concerns code that is re-reviewed (changed hunks and their graph neighbors).
+        """
+        if not isinstance(finding, dict) or not finding.get("file"):
+            return finding if keep_unlocated else None
+        path = _strip_prefix(finding["file"])
+        function = finding.get("function") or finding.get("target")
+        if function and self._in_scope(function):
+            return None
+        if finding.get("line") is not None:
+            line = self.delta.map_line(path, int(finding["line"]))
+            return None if line is None else dict(finding, line=line)
+        return None if path in self.delta.changed_ranges() else finding
+
+    def merge_review(self, prior: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+        """New review of the changed scope plus prior issues on untouched code."""
+        carried = [issue for issue in map(self.relocate, prior.get("issues") or []) if issue is not None]
+        merged = dict(new)
+        merged["issues"] = carried + list(new.get("issues") or [])
+        # issues that blocked the prior review and are still there keep blocking it
+        merged["overall_good"] = bool(new.get("overall_good", True)) and (prior.get("overall_good", True) or not carried)
+        merged["incremental"] = self.summary(len(carried))
+        return merged
+
+    def merge_tests(self, prior: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+        """New tests for the changed scope plus prior tests that do not target it."""
+        new_cases = list(new.get("new_test_cases") or [])
+        names = {case.get("test_name") for case in new_cases if isinstance(case, dict)}
+        carried = []
+        for case in prior.get("new_test_cases") or []:
+            if isinstance(case, dict) and case.get("test_name") in names:
+                continue
+            case = self.relocate(case, keep_unlocated=True)
+            if case is not None:
+                carried.append(case)
+        merged = dict(new)
+        merged["new_test_cases"] = carried + new_cases
+        merged["incremental"] = self.summary(len(carried))
+        return merged
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, AsyncIterator, Iterable, Union
+
+from ..models.schemas import WorkflowStepResult
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) for progress reporting."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Extract the text delta from a raw string or an OpenAI-style stream chunk."""
+    if chunk is None:
+        return ""
+    if isinstance(chunk, str):
+        return chunk
+    if isinstance(chunk, dict):
+        choices = chunk.get("choices") or []
+        delta = choices[0].get("delta", {}) if choices else {}
+        return delta.get("content") or ""
+    choices = getattr(chunk, "choices", None) or []
+    delta = getattr(choices[0], "delta", None) if choices else None
+    return getattr(delta, "content", None) or ""
+
+
+async def iter_stream_text(stream: Union[AsyncIterator[Any], Iterable[Any]]) -> AsyncIterator[str]:
+    """Yield text deltas from a sync or async LLM response stream."""
+    if hasattr(stream, "__aiter__"):
+        async for chunk in stream:
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+    else:
+        for chunk in stream:
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+            # give the event loop a chance to serve status polls
+            await asyncio.sleep(0)
+
+
+async def simulated_stream(text: str, duration: float, chunk_chars: int = 16) -> AsyncIterator[str]:
+    """Stream a mock response in small chunks spread over `duration` seconds."""
+    chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+    delay = duration / len(chunks)
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+async def consume_stream(step_result: WorkflowStepResult, stream: Union[AsyncIterator[Any], Iterable[Any]],
+                         expected_tokens: int, on_update=None) -> str:
+    """
+    Append a streamed LLM response to `step_result.partial_result` as it arrives.
+
+    `tokens_received` and `expected_tokens` are kept on the step so the status
+    endpoint can estimate progress within the step. Returns the full text.
+    """
+    parts = []
+    step_result.partial_result = ""
+    step_result.tokens_received = 0
+    step_result.expected_tokens = expected_tokens
+
+    async for text in iter_stream_text(stream):
+        parts.append(text)
+        step_result.partial_result += text
+        step_result.tokens_received += estimate_tokens(text)
+        if on_update:
+            on_update()
+
+    return "".join(parts)
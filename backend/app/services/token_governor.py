@@ -0,0 +1,200 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import logging
+
+from ..utils.config import settings
+
+
+class _LocalBucket:
+    """Token bucket shared by everything in this process."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, amount: float) -> float:
+        """Take `amount` tokens if available; otherwise return the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # a request larger than the whole bucket is admitted once the bucket is full
+            needed = min(amount, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= amount
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def adjust(self, delta: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class _FileBucket(_LocalBucket):
+    """Token bucket whose state lives in a locked file, shared by all workers on the host."""
+
+    def __init__(self, capacity: float, rate: float, path: str):
+        super().__init__(capacity, rate)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _locked(self, update):
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                # wall-clock time, since monotonic clocks are not comparable across processes
+                now = time.time()
+                self.tokens = state.get("tokens", self.capacity)
+                self.updated = state.get("updated", now)
+                self._refill(now)
+                result = update()
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": self.tokens, "updated": self.updated}))
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_take(self, amount: float) -> float:
+        def take():
+            needed = min(amount, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= amount
+                return 0.0
+            return (needed - self.tokens) / self.rate
+        return self._locked(take)
+
+    def adjust(self, delta: float):
+        def apply():
+            self.tokens = min(self.capacity, self.tokens + delta)
+        self._locked(apply)
+
+    def available(self) -> float:
+        return self._locked(lambda: self.tokens)
+
+
+@dataclass
+class Reservation:
+    estimate: int
+    reserved_at: float
+    waited: float
+
+
+class TokenGovernor:
+    """
+    Token-per-minute governor for all LLM calls of this process (or host).
+
+    Every call reserves its estimated prompt+completion tokens before it is
+    sent, waiting until the bucket can cover them, and reconciles with the
+    actual usage afterwards. Callers are served in FIFO order.
+    """
+
+    def __init__(self, tokens_per_minute: int, burst: Optional[int] = None, state_file: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = tokens_per_minute > 0
+        self.rate = tokens_per_minute / 60.0
+        capacity = float(burst or tokens_per_minute)
+        if not self.enabled:
+            self.bucket = None
+        elif state_file:
+            self.bucket = _FileBucket(capacity, self.rate, state_file)
+        else:
+            self.bucket = _LocalBucket(capacity, self.rate)
+        self.queued_tokens = 0
+        self._queue_lock: Optional[asyncio.Lock] = None
+
+    async def _bucket_call(self, method, *args):
+        """
+        Call a bucket method without blocking the event loop.
+
+        A file bucket waits for an flock held by other workers and does file
+        I/O, so it runs in the default executor.
+        """
+        if not isinstance(self.bucket, _FileBucket):
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    async def _try_take(self, estimate: int) -> float:
+        if not isinstance(self.bucket, _FileBucket):
+            return self.bucket.try_take(estimate)
+        loop = asyncio.get_running_loop()
+        take = loop.run_in_executor(None, self.bucket.try_take, estimate)
+        try:
+            return await asyncio.shield(take)
+        except asyncio.CancelledError:
+            # the take still finishes in its thread; return tokens it took to the bucket
+            def refund(future):
+                if not future.cancelled() and future.exception() is None and future.result() <= 0:
+                    loop.run_in_executor(None, self.bucket.adjust, estimate)
+            take.add_done_callback(refund)
+            raise
+
+    async def reserve(self, estimate: int) -> Reservation:
+        """Wait until `estimate` tokens can be spent, then take them."""
+        start_time = time.monotonic()
+        if not self.enabled:
+            return Reservation(estimate, start_time, 0.0)
+
+        if self._queue_lock is None:
+            self._queue_lock = asyncio.Lock()
+        self.queued_tokens += estimate
+        try:
+            async with self._queue_lock:
+                while True:
+                    wait = await self._try_take(estimate)
+                    if wait <= 0:
+                        break
+                    # re-check at least every second in case other workers refunded tokens
+                    await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self.queued_tokens -= estimate
+
+        waited = time.monotonic() - start_time
+        if waited > 0.5:
+            self.logger.info(f"Token governor delayed a {estimate}-token request by {waited:.1f}s")
+        return Reservation(estimate, start_time, waited)
+
+    async def reconcile(self, reservation: Reservation, actual_tokens: Optional[int]):
+        """Refund over-estimates (or charge under-estimates) once actual usage is known."""
+        if not self.enabled or actual_tokens is None:
+            return
+        await self._bucket_call(self.bucket.adjust, reservation.estimate - actual_tokens)
+
+    async def charge(self, tokens: int):
+        """Take tokens without waiting, e.g. for a hedged duplicate request."""
+        if self.enabled:
+            await self._bucket_call(self.bucket.adjust, -tokens)
+
+    async def projected_wait(self, additional_tokens: int = 0) -> float:
+        """Seconds until the queued demand plus `additional_tokens` could be served."""
+        if not self.enabled:
+            return 0.0
+        deficit = self.queued_tokens + additional_tokens - await self._bucket_call(self.bucket.available)
+        return max(0.0, deficit / self.rate)
+
+
+token_governor = TokenGovernor(
+    settings.llm_tokens_per_minute, settings.llm_token_burst, settings.llm_token_state_file
+)
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import time
+from argparse import Namespace
+from typing import Dict, Any, Optional
+import logging
+
+from ..utils.config import settings
+from ..utils.pipeline import import_pipeline_module, import_times, resolve_pipeline_path
+
+
+class WarmupService:
+    """Preloads code graphs and their centrality scores before traffic arrives."""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.started = False
+        self.finished = False
+        self.warmup_time: Optional[float] = None
+        self.components: Dict[str, Dict[str, Any]] = {}
+
+        # Preloaded artifacts, keyed by (resolved repo_path, module_path, repo commit);
+        # read by the graph view service
+        self.code_graphs: Dict[str, Any] = {}
+        self.centralities: Dict[str, Any] = {}
+
+    @property
+    def ready(self) -> bool:
+        """True once warm-up has finished and no component failed."""
+        return self.finished and all(
+            component["status"] != "failed" for component in self.components.values()
+        )
+
+    async def warm_up(self):
+        """Run every configured warm-up component, off the event loop."""
+        if self.started:
+            return
+        self.started = True
+        start_time = time.perf_counter()
+
+        for repo in settings.warmup_repos:
+            await self._run_component(f"graph:{repo['repo_path']}", self._load_repo, repo)
+
+        self.warmup_time = time.perf_counter() - start_time
+        self.finished = True
+        self.logger.info(f"Warm-up finished in {self.warmup_time:.2f}s (ready={self.ready})")
+
+    def skip(self):
+        """Mark the service ready without preloading anything."""
+        self.started = self.finished = True
+        self.warmup_time = 0.0
+
+    async def _run_component(self, name: str, loader, *args):
+        start_time = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, loader, *args)
+            status, error = "loaded", None
+        except ImportError as e:
+            # optional pipeline dependencies are not installed
+            status, error = "skipped", str(e)
+        except Exception as e:
+            status, error = "failed", str(e)
+
+        elapsed = time.perf_counter() - start_time
+        self.components[name] = {"status": status, "time": elapsed, "error": error}
+        if status == "loaded":
+            self.logger.info(f"Warm-up: {name} loaded in {elapsed:.2f}s")
+        else:
+            self.logger.warning(f"Warm-up: {name} {status}: {error}")
+
+    def _load_repo(self, repo: Dict[str, str]):
+        graph_extraction = import_pipeline_module("graph_extraction")
+        graph_centrality = import_pipeline_module("graph_centrality")
+        lexical_index = import_pipeline_module("lexical_index")
+
+        # repo paths in the settings are relative to the pipeline root, like request paths
+        repo_path = resolve_pipeline_path(repo["repo_path"])
+        repo_root = resolve_pipeline_path(repo.get("repo_root") or os.path.dirname(repo_path))
+        if not os.path.isdir(repo_path):
+            raise FileNotFoundError(f"Repository not found: {repo_path}")
+        
+        repo_args = Namespace(repo_root=repo_root, repo_path=repo_path,
+                              module_path=repo.get("module_path", ""), logger=self.logger)
+        key = (repo_path, repo_args.module_path, lexical_index.get_repo_commit(repo_path))
+        self.code_graphs[key] = graph_extraction.build_code_graph(repo_args)
+        self.centralities[key] = graph_centrality.get_centrality(repo_args, self.code_graphs[key][0])
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """Readiness report for the /ready endpoint."""
+        return {
+            "ready": self.ready,
+            "started": self.started,
+            "finished": self.finished,
+            "warmup_time": self.warmup_time,
+            "components": self.components,
+            "import_times": dict(import_times),
+        }
@@ -1,6 +1,14 @@
 import os
-from typing import Optional
-from pydantic import BaseSettings
+from typing import Optional, List, Dict
+try:
+    from pydantic_settings import BaseSettings
+except ImportError:  # pydantic v1
+    from pydantic import BaseSettings
+
+from .pipeline import import_pipeline_module
+
+# Model cascade defaults are shared with the CLI pipeline
+model_tiering = import_pipeline_module("model_tiering")
 
 
 class Settings(BaseSettings):
@@ -25,15 +33,89 @@ class Settings(BaseSettings):
     # Logging
     log_level: str = "INFO"
     log_format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    log_dir: str = "logs"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    log_per_workflow_files: bool = True
+    log_max_open_workflow_files: int = 64
+    # Messages longer than this (e.g. full prompts) are truncated in the log;
+    # with offloading enabled the full text goes to a gzip sidecar file
+    log_inline_max_chars: int = 4000
+    log_offload_large_messages: bool = True
     
     # Workflow Settings
     max_concurrent_workflows: int = 10
     workflow_timeout: int = 300  # 5 minutes
+    # Typical response length per step, used to estimate streaming progress
+    step_expected_tokens: Dict[str, int] = {
+        "routing": 300,
+        "architect": 800,
+        "review": 600,
+        "test_generation": 1500,
+    }
+    status_stream_interval: float = 0.25
+    
+    # Step result fields larger than this are moved to the blob store and
+    # replaced by a reference with an inline summary
+    blob_store_dir: str = "blob_store"
+    blob_inline_max_bytes: int = 2048
+    
+    # Knowledge-graph views: detailed nodes per view, default neighborhood size
+    # and page size when expanding a collapsed module
+    graph_view_max_nodes: int = 300
+    graph_view_default_hops: int = 1
+    graph_view_page_size: int = 200
+    
+    # Sampling interval when profiling workflows started with profile=true
+    profile_sample_interval: float = 0.005
+    
+    # Re-reviews also re-run review/test generation on the graph neighbors of
+    # changed functions up to this many hops away
+    rereview_neighbor_hops: int = 1
+    
+    # Hedged LLM calls: a call still running after the observed hedge_percentile
+    # latency of its step/model gets a duplicate request; hedge_budget caps the
+    # duplicates as a fraction of all calls. Step deadlines split the time left
+    # until workflow_timeout over the remaining steps.
+    hedge_enabled: bool = True
+    hedge_percentile: float = 95.0
+    hedge_min_samples: int = 20
+    hedge_latency_window: int = 200
+    hedge_budget: float = 0.1
     
     # LLM Settings (for future integration)
     llm_api_key: Optional[str] = None
     llm_model: str = "gpt-4o"
     llm_max_tokens: int = 4000
+    # Model cascade per step, cheapest first; a step escalates to the next model
+    # when the answer is malformed or below escalation_min_confidence
+    step_models: Dict[str, List[str]] = model_tiering.DEFAULT_STEP_MODELS
+    escalation_min_confidence: float = model_tiering.DEFAULT_MIN_CONFIDENCE
+    
+    # Token-rate governor: 0 disables it. With a state file the bucket is shared
+    # by all workers on the host.
+    llm_tokens_per_minute: int = 0
+    llm_token_burst: Optional[int] = None
+    llm_token_state_file: Optional[str] = None
+    # Typical prompt size per step, reserved together with step_expected_tokens
+    step_prompt_tokens: Dict[str, int] = {
+        "routing": 3000,
+        "architect": 6000,
+        "review": 6000,
+        "test_generation": 8000,
+    }
+    
+    # LLM record/replay: mode is "off", "record" or "replay"; replayed responses
+    # are served with the "recorded" or "zero" latency
+    llm_cassette_path: Optional[str] = None
+    llm_cassette_mode: str = "off"
+    llm_replay_latency: str = "zero"
+    
+    # Warm-up Settings
+    warmup_on_startup: bool = True
+    # Repos whose graphs are preloaded, e.g.
+    # [{"repo_root": "PR_repos", "repo_path": "PR_repos/xarray", "module_path": "xarray"}]
+    warmup_repos: List[Dict[str, str]] = []
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,150 @@
+import gzip
+import itertools
+import logging
+import logging.handlers
+import os
+import queue
+from collections import OrderedDict
+from typing import Optional
+
+from .config import settings
+
+WORKFLOW_LOGGER_NAME = "workflow"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_queue: Optional[queue.Queue] = None
+
+
+class _DispatchHandler(logging.Handler):
+    """
+    Runs in the listener thread and does all the actual log I/O.
+
+    Large messages (full prompts and responses) are truncated or offloaded to
+    gzip sidecar files first, then each record goes to the console, the
+    rotating application log and, for records carrying a `workflow_id`, the
+    workflow's own log.
+    """
+
+    def __init__(self, log_dir: str, formatter: logging.Formatter):
+        super().__init__()
+        self.log_dir = log_dir
+        self.formatter = formatter
+        self.handlers = [logging.StreamHandler()]
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            self.handlers.append(self._rotating_handler(os.path.join(log_dir, "app.log")))
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+        self.workflow_handlers: "OrderedDict[str, logging.Handler]" = OrderedDict()
+        self._sidecar_counter = itertools.count()
+
+    def _rotating_handler(self, path: str) -> logging.Handler:
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=settings.log_max_bytes, backupCount=settings.log_backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(self.formatter)
+        return handler
+
+    def _workflow_handler(self, workflow_id: str) -> logging.Handler:
+        handler = self.workflow_handlers.pop(workflow_id, None)
+        if handler is None:
+            workflow_dir = os.path.join(self.log_dir, "workflows")
+            os.makedirs(workflow_dir, exist_ok=True)
+            handler = self._rotating_handler(os.path.join(workflow_dir, f"{workflow_id}.log"))
+        self.workflow_handlers[workflow_id] = handler
+
+        # Keep the number of open files bounded
+        while len(self.workflow_handlers) > settings.log_max_open_workflow_files:
+            _, oldest = self.workflow_handlers.popitem(last=False)
+            oldest.close()
+        return handler
+
+    def _shrink_message(self, record: logging.LogRecord, workflow_id: Optional[str]):
+        message = record.getMessage()
+        limit = settings.log_inline_max_chars
+        if limit <= 0 or len(message) <= limit:
+            return
+
+        head = message[:limit]
+        if settings.log_offload_large_messages and self.log_dir:
+            sidecar_dir = os.path.join(self.log_dir, "sidecars", workflow_id or "app")
+            os.makedirs(sidecar_dir, exist_ok=True)
+            sidecar_path = os.path.join(
+                sidecar_dir, f"{int(record.created * 1000)}-{next(self._sidecar_counter)}.txt.gz"
+            )
+            with gzip.open(sidecar_path, "wt", encoding="utf-8") as f:
+                f.write(message)
+            record.msg = f"{head}... [{len(message)} chars, full text in {sidecar_path}]"
+        else:
+            record.msg = f"{head}... [truncated {len(message) - limit} chars]"
+        record.args = None
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            workflow_id = getattr(record, "workflow_id", None)
+            if workflow_id:
+                # shown as workflow.<id> in the application log
+                record.name = f"{record.name}.{workflow_id}"
+
+            self._shrink_message(record, workflow_id)
+
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            if workflow_id and self.log_dir and settings.log_per_workflow_files:
+                self._workflow_handler(workflow_id).handle(record)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for handler in itertools.chain(self.handlers, self.workflow_handlers.values()):
+            handler.close()
+        self.workflow_handlers.clear()
+        super().close()
+
+
+def setup_queue_logging() -> logging.handlers.QueueListener:
+    """
+    Route all logging through an in-memory queue drained by a listener thread.
+
+    Callers (including the event loop) only pay for enqueuing a record; file
+    writes, rotation and sidecar compression happen on the listener thread.
+    """
+    global _listener, _log_queue
+    if _listener is not None:
+        return _listener
+
+    _log_queue = queue.Queue(-1)
+    formatter = logging.Formatter(settings.log_format)
+    dispatcher = _DispatchHandler(settings.log_dir, formatter)
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    root_logger.setLevel(settings.log_level)
+
+    _listener = logging.handlers.QueueListener(_log_queue, dispatcher, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def shutdown_queue_logging():
+    """Flush the queue and stop the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def get_workflow_logger(workflow_id: str) -> logging.LoggerAdapter:
+    """
+    Logger whose records also go to the workflow's own log file.
+
+    All workflows share one logger and tag their records with the workflow ID,
+    so no logger is registered (and kept forever) per workflow.
+    """
+    return logging.LoggerAdapter(logging.getLogger(WORKFLOW_LOGGER_NAME), {"workflow_id": workflow_id})
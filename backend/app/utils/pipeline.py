@@ -0,0 +1,32 @@
+import importlib
+import os
+import sys
+import time
+from types import ModuleType
+from typing import Dict
+
+# The agent pipeline (main.py, query_*_agent.py, ...) lives in the project root,
+# one level above the backend package.
+PIPELINE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+# Seconds spent importing each pipeline module, for startup reporting
+import_times: Dict[str, float] = {}
+
+
+def resolve_pipeline_path(path: str) -> str:
+    """Resolve a path from a workflow request, which is relative to the pipeline root."""
+    return path if os.path.isabs(path) else os.path.join(PIPELINE_ROOT, path)
+
+
+def import_pipeline_module(name: str) -> ModuleType:
+    """Import a module of the agent pipeline on first use and record its import time."""
+    if name in sys.modules:
+        return sys.modules[name]
+
+    if PIPELINE_ROOT not in sys.path:
+        sys.path.append(PIPELINE_ROOT)
+
+    start_time = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - start_time
+    return module
@@ -0,0 +1,70 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from app.services import graph_view_service
+from app.services.graph_view_service import GraphViewService, changed_node_ids
+
+GRAPH = {
+    "nodes": [
+        {"id": "pkg.utils", "type": "module", "file": "pkg/utils.py"},
+        {"id": "pkg.utils.f", "type": "function", "file": "pkg/utils.py", "lineno": 1, "end_lineno": 5},
+    ],
+    "edges": [],
+}
+
+
+def fake_pipeline(monkeypatch, commit):
+    builds = []
+
+    def build_code_graph(args):
+        builds.append(threading.get_ident())
+        time.sleep(0.05)
+        return GRAPH, {}
+
+    modules = {
+        "lexical_index": SimpleNamespace(get_repo_commit=lambda repo_path: commit[0]),
+        "graph_extraction": SimpleNamespace(build_code_graph=build_code_graph),
+    }
+    monkeypatch.setattr(graph_view_service, "import_pipeline_module", modules.__getitem__)
+    return builds
+
+
+REQUEST = {"repo_root": "/repos", "repo_path": "/repos/pkg", "module_path": "pkg"}
+
+
+def test_concurrent_loads_build_the_view_once(monkeypatch):
+    builds = fake_pipeline(monkeypatch, ["c1"])
+    service = GraphViewService()
+
+    with ThreadPoolExecutor(8) as pool:
+        views = list(pool.map(lambda _: service._load_view(REQUEST), range(8)))
+
+    assert len(builds) == 1
+    assert all(view is views[0] for view in views)
+
+
+def test_new_commit_replaces_the_stale_view(monkeypatch):
+    commit = ["c1"]
+    builds = fake_pipeline(monkeypatch, commit)
+    service = GraphViewService()
+
+    first = service._load_view(REQUEST)
+    commit[0] = "c2"
+    with ThreadPoolExecutor(4) as pool:
+        views = list(pool.map(lambda _: service._load_view(REQUEST), range(4)))
+
+    assert len(builds) == 2
+    assert views[0] is not first
+    assert list(service._views) == [("/repos/pkg", "pkg", "c2")]
+
+
+def test_changed_node_ids_match_on_path_boundaries():
+    graph = {"nodes": GRAPH["nodes"] + [
+        {"id": "pkg.myutils.g", "type": "function", "file": "pkg/myutils.py", "lineno": 1, "end_lineno": 5},
+    ]}
+
+    assert changed_node_ids(graph, {"xpkg/utils.py": [(2, 2)]}) == []
+    assert changed_node_ids(graph, {"pkg/utils.py": [(2, 2)]}) == ["pkg.utils.f"]
+    assert changed_node_ids(graph, {"pkg/myutils.py": [(2, 2)]}) == ["pkg.myutils.g"]
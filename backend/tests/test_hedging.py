@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.hedging import HedgeController, StepDeadlineExceeded
+
+
+def make_controller(budget=1.0, fast_latency=0.01):
+    """Controller whose review/m hedge threshold is already ~fast_latency."""
+    controller = HedgeController(percentile=95, min_samples=5, window=50, budget=budget)
+    controller.latencies[("review", "m")].extend([fast_latency] * 10)
+    controller.primary_total = 10
+    return controller
+
+
+def attempts(primary, hedge):
+    """attempt(is_hedge) that runs the given coroutine functions."""
+    started = []
+
+    async def attempt(is_hedge):
+        started.append(is_hedge)
+        return await (hedge if is_hedge else primary)()
+    return attempt, started
+
+
+def after(delay, value=None, error=None):
+    async def run():
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return value
+    return run
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    controller = make_controller()
+    attempt, started = attempts(after(0.001, "primary"), after(0.001, "hedge"))
+
+    result, outcome = await controller.call("review", "m", attempt, time.monotonic() + 1)
+
+    assert result == "primary"
+    assert started == [False]
+    assert not outcome.hedged
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled_when_hedge_wins():
+    controller = make_controller()
+    primary_cancelled = asyncio.Event()
+
+    async def slow_primary():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+
+    attempt, started = attempts(slow_primary, after(0.01, "hedge"))
+    result, outcome = await controller.call("review", "m", attempt, time.monotonic() + 1)
+    await asyncio.sleep(0)
+
+    assert result == "hedge"
+    assert started == [False, True]
+    assert outcome.hedged and outcome.hedge_won
+    assert primary_cancelled.is_set()
+    stats = controller.stats()["steps"]["review/m"]
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_primary_failure_waits_for_pending_hedge():
+    controller = make_controller()
+    attempt, _ = attempts(after(0.05, error=RuntimeError("primary failed")), after(0.1, "hedge"))
+
+    result, outcome = await controller.call("review", "m", attempt, time.monotonic() + 1)
+
+    assert result == "hedge"
+    assert outcome.hedge_won
+
+
+@pytest.mark.asyncio
+async def test_all_attempts_failing_raises_primary_error():
+    controller = make_controller()
+    attempt, _ = attempts(after(0.05, error=RuntimeError("primary failed")),
+                          after(0.06, error=ValueError("hedge failed")))
+
+    with pytest.raises(RuntimeError, match="primary failed"):
+        await controller.call("review", "m", attempt, time.monotonic() + 1)
+
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_prevents_hedging():
+    controller = make_controller(budget=0.0)
+    attempt, started = attempts(after(0.05, "primary"), after(0.001, "hedge"))
+
+    result, outcome = await controller.call("review", "m", attempt, time.monotonic() + 1)
+
+    assert result == "primary"
+    assert started == [False]
+    assert not outcome.hedged
+    assert controller.stats()["budget_used"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded_cancels_attempts():
+    controller = make_controller()
+    attempt, started = attempts(after(5, "primary"), after(5, "hedge"))
+
+    start_time = time.monotonic()
+    with pytest.raises(StepDeadlineExceeded):
+        await controller.call("review", "m", attempt, time.monotonic() + 0.1)
+
+    assert time.monotonic() - start_time < 1
+    assert started == [False, True]
+    assert controller.stats()["steps"]["review/m"]["deadline_exceeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedging_before_min_samples():
+    controller = HedgeController(percentile=95, min_samples=5, window=50, budget=1.0)
+    attempt, started = attempts(after(0.05, "primary"), after(0.001, "hedge"))
+
+    result, _ = await controller.call("review", "m", attempt, time.monotonic() + 1)
+
+    assert result == "primary"
+    assert started == [False]
+    assert controller.threshold("review", "m") is None
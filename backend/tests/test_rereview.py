@@ -0,0 +1,130 @@
+from app.models.schemas import WorkflowStatus, WorkflowStep, WorkflowStepResult
+from app.services.graph_view_service import parse_patch_changes
+from app.services.rereview import ReReviewPlan, compute_delta, parse_hunks
+
+
+def hunk(old_start, old_length, new_start, new_length, body):
+    return f"@@ -{old_start},{old_length} +{new_start},{new_length} @@\n" + "".join(line + "\n" for line in body)
+
+
+def patch(*hunks, path="pkg/mod.py"):
+    return f"--- a/{path}\n+++ b/{path}\n" + "".join(hunks)
+
+
+# one line inserted after base line 10, one line replaced at base line 50
+FIRST = hunk(10, 1, 10, 2, [" a = 1", "+b = 2"])
+SECOND = hunk(50, 1, 51, 1, ["-c = 3", "+c = 4"])
+# the same second change, one line further down because the first hunk grew
+FIRST_GROWN = hunk(10, 1, 10, 3, [" a = 1", "+b = 2", "+b2 = 2"])
+SECOND_SHIFTED = hunk(50, 1, 52, 1, ["-c = 3", "+c = 4"])
+
+
+def test_parse_hunks_counts_removed_lines_starting_with_dashes():
+    text = patch(hunk(5, 3, 5, 1, ["--- not a header", "-+++ nor this", " keep"]), hunk(20, 1, 18, 1, ["-x", "+y"]))
+
+    hunks = parse_hunks(text)["pkg/mod.py"]
+
+    assert len(hunks) == 2
+    assert hunks[0].lines == ["--- not a header", "-+++ nor this", " keep"]
+    assert (hunks[1].old_start, hunks[1].new_start) == (20, 18)
+
+
+def test_parse_patch_changes_uses_new_side_ranges_and_skips_deleted_files():
+    deleted = "--- a/gone.py\n+++ /dev/null\n" + hunk(1, 2, 0, 0, ["-a", "-b"])
+
+    changes = parse_patch_changes(patch(FIRST, SECOND) + deleted)
+
+    assert changes == {"pkg/mod.py": [(10, 11), (51, 51)]}
+
+
+def test_unchanged_patch_has_empty_delta():
+    text = patch(FIRST, SECOND)
+
+    delta = compute_delta(text, text)
+
+    assert delta.is_empty and delta.same_files
+    assert delta.unchanged_count == 2
+    assert delta.scoped_patch() == ""
+
+
+def test_shifted_hunk_matches_and_changed_hunk_is_rereviewed():
+    delta = compute_delta(patch(FIRST, SECOND), patch(FIRST_GROWN, SECOND_SHIFTED))
+
+    assert [h.new_start for h in delta.changed] == [10]
+    assert [h.new_start for h in delta.removed] == [10]
+    assert delta.matches[("pkg/mod.py", 1)].new_start == 52
+    assert delta.changed_ranges() == {"pkg/mod.py": [(10, 12)]}
+    assert parse_hunks(delta.scoped_patch())["pkg/mod.py"][0].lines == [" a = 1", "+b = 2", "+b2 = 2"]
+
+
+def test_map_line_follows_shifts_and_drops_changed_code():
+    delta = compute_delta(patch(FIRST, SECOND), patch(FIRST_GROWN, SECOND_SHIFTED))
+
+    # inside the matched hunk
+    assert delta.map_line("pkg/mod.py", 51) == 52
+    # untouched code before, between and after the hunks
+    assert delta.map_line("pkg/mod.py", 5) == 5
+    assert delta.map_line("pkg/mod.py", 30) == 31
+    assert delta.map_line("pkg/mod.py", 80) == 81
+    # inside the hunk that changed
+    assert delta.map_line("pkg/mod.py", 11) is None
+
+
+def test_removed_hunk_shifts_following_lines_back():
+    delta = compute_delta(patch(FIRST, SECOND), patch(SECOND_SHIFTED.replace("+52", "+50")))
+
+    assert [h.new_start for h in delta.removed] == [10]
+    assert not delta.changed
+    # findings on reverted code are dropped
+    assert delta.map_line("pkg/mod.py", 10) is None
+    assert delta.map_line("pkg/mod.py", 30) == 29
+    assert delta.map_line("pkg/mod.py", 51) == 50
+    assert delta.map_line("pkg/mod.py", 80) == 79
+
+
+def test_file_dropped_from_patch_changes_the_file_set():
+    delta = compute_delta(patch(FIRST) + patch(SECOND, path="pkg/other.py"), patch(FIRST))
+
+    assert not delta.same_files
+    assert [h.file for h in delta.removed] == ["pkg/other.py"]
+    assert delta.map_line("pkg/other.py", 51) is None
+    assert delta.map_line("pkg/other.py", 60) == 60
+
+
+def plan_with_prior(delta, *steps, result=None):
+    prior = {step: WorkflowStepResult(step=step, status=WorkflowStatus.COMPLETED, result=result) for step in steps}
+    return ReReviewPlan("prev", delta, prior, scope_nodes=["pkg.mod.f"])
+
+
+def test_step_without_prior_result_sees_the_full_patch():
+    new_patch = patch(FIRST_GROWN, SECOND_SHIFTED)
+    plan = plan_with_prior(compute_delta(patch(FIRST, SECOND), new_patch),
+                           WorkflowStep.ROUTING, WorkflowStep.ARCHITECT)
+
+    for step in (WorkflowStep.REVIEW, WorkflowStep.TEST_GENERATION):
+        assert plan.agent_scope(step, new_patch) == {"patch": new_patch, "scope_nodes": []}
+
+
+def test_step_with_prior_result_sees_only_the_changed_hunks():
+    new_patch = patch(FIRST_GROWN, SECOND_SHIFTED)
+    plan = plan_with_prior(compute_delta(patch(FIRST, SECOND), new_patch), WorkflowStep.REVIEW)
+
+    scope = plan.agent_scope(WorkflowStep.REVIEW, new_patch)
+
+    assert [h.lines for h in parse_hunks(scope["patch"])["pkg/mod.py"]] == [h.lines for h in plan.delta.changed]
+    assert scope["scope_nodes"] == ["pkg.mod.f"]
+
+
+def test_removed_hunks_only_carry_prior_findings_forward():
+    prior = {"overall_good": False, "reasons": ["r"], "issues": [
+        {"file": "pkg/mod.py", "line": 10, "issue": "on the reverted hunk"},
+        {"file": "pkg/mod.py", "line": 51, "issue": "on the kept hunk"},
+    ]}
+    delta = compute_delta(patch(FIRST, SECOND), patch(SECOND_SHIFTED.replace("+52", "+50")))
+    plan = plan_with_prior(delta, WorkflowStep.REVIEW, result=prior)
+
+    assert plan.agent_scope(WorkflowStep.REVIEW, "full patch") is None
+    merged = plan.carry_forward(WorkflowStep.REVIEW, prior)
+    assert merged["issues"] == [{"file": "pkg/mod.py", "line": 50, "issue": "on the kept hunk"}]
+    assert merged["overall_good"] is False
+    assert merged["reasons"] == ["r"]
@@ -0,0 +1,57 @@
+import asyncio
+import fcntl
+import time
+
+import pytest
+
+from app.services.token_governor import TokenGovernor
+
+
+@pytest.mark.asyncio
+async def test_file_bucket_lock_does_not_block_the_event_loop(tmp_path):
+    state_file = str(tmp_path / "tokens.json")
+    governor = TokenGovernor(tokens_per_minute=6000, state_file=state_file)
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    with open(state_file, "a+") as held:
+        # another worker holds the bucket's lock
+        fcntl.flock(held, fcntl.LOCK_EX)
+        ticking = asyncio.ensure_future(ticker())
+        reserving = asyncio.ensure_future(governor.reserve(100))
+        await asyncio.sleep(0.2)
+        assert not reserving.done()
+        assert ticks >= 10
+        fcntl.flock(held, fcntl.LOCK_UN)
+
+    reservation = await asyncio.wait_for(reserving, 1)
+    ticking.cancel()
+    assert reservation.estimate == 100
+    assert await governor.projected_wait() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_reservation_returns_its_tokens(tmp_path):
+    state_file = str(tmp_path / "tokens.json")
+    governor = TokenGovernor(tokens_per_minute=6000, state_file=state_file)
+
+    with open(state_file, "a+") as held:
+        fcntl.flock(held, fcntl.LOCK_EX)
+        reserving = asyncio.ensure_future(governor.reserve(3000))
+        await asyncio.sleep(0.05)
+        reserving.cancel()
+        fcntl.flock(held, fcntl.LOCK_UN)
+
+    with pytest.raises(asyncio.CancelledError):
+        await reserving
+    # the take finished in its thread after the cancellation and was refunded
+    deadline = time.monotonic() + 1
+    while time.monotonic() < deadline and governor.bucket.available() < 6000 - 1:
+        await asyncio.sleep(0.01)
+    assert governor.bucket.available() >= 6000 - 1
@@ -6,6 +6,15 @@ export interface WorkflowStepResult {
   step: WorkflowStep;
   status: WorkflowStatus;
   result?: any;
+  partial_result?: string;
+  tokens_received?: number;
+  expected_tokens?: number;
+  model?: string;
+  model_tier?: number;
+  escalated?: boolean;
+  reused_from?: string;
+  hedged?: boolean;
+  hedge_won?: boolean;
   error?: string;
   execution_time?: number;
 }
@@ -43,6 +52,8 @@ export interface PRDataRequest {
   update_deps_graph: boolean;
   update_kd_graph: boolean;
   verbose: boolean;
+  profile?: boolean;
+  previous_workflow_id?: string;
 }
 
 export interface AgentOutput {
@@ -0,0 +1,347 @@
+"""
+Native call-graph extraction for the knowledge graph.
+
+Modules are parsed with `ast` across a process pool and turned into
+function/class nodes plus `contains`, `calls` and `inherits` edges. The parse
+result of every file is cached on disk by the sha1 of its content, so after
+the first build a typical PR only re-parses the handful of files it touches.
+
+The output is a node-link dict (the same layout as `knowledge_graph.json`)
+and a `file_function_map` of `{relative file path: [function names]}`.
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from lexical_index import iter_python_files
+
+
+CACHE_VERSION = 2
+CACHE_DIR_NAME = '.graph_cache'
+# below this many files the process pool start-up costs more than it saves
+MIN_FILES_FOR_POOL = 16
+
+
+#---------- per-file parsing (runs in worker processes)
+
+def module_name_from_path(rel_path):
+    parts = rel_path[:-3].split(os.sep)
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return '.'.join(parts)
+
+
+def _expr_name(node):
+    """Dotted name of a Name/Attribute chain, or None for anything dynamic."""
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return '.'.join(reversed(parts))
+    return None
+
+
+class _ModuleVisitor(ast.NodeVisitor):
+
+    def __init__(self, module, is_package=False):
+        self.module = module
+        self.is_package = is_package
+        self.scope = []          # list of (kind, name)
+        self.functions = []
+        self.classes = []
+        self.calls = []
+        self.imports = {}
+
+    def _qualname(self, name):
+        return '.'.join([n for _, n in self.scope] + [name])
+
+    def _innermost(self, kind):
+        """Qualified name of the innermost enclosing scope of the given kind."""
+        for i in range(len(self.scope) - 1, -1, -1):
+            if self.scope[i][0] == kind:
+                return '.'.join(n for _, n in self.scope[:i + 1])
+        return None
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.imports[alias.asname or alias.name.split('.')[0]] = \
+                alias.name if alias.asname else alias.name.split('.')[0]
+
+    def visit_ImportFrom(self, node):
+        base = node.module or ''
+        if node.level:
+            package_parts = self.module.split('.')
+            # an __init__ module is its own package
+            drop = node.level - 1 if self.is_package else node.level
+            package_parts = package_parts[:len(package_parts) - drop] if drop else package_parts
+            base = '.'.join(p for p in package_parts + ([node.module] if node.module else []) if p)
+        for alias in node.names:
+            if alias.name == '*':
+                continue
+            self.imports[alias.asname or alias.name] = f"{base}.{alias.name}" if base else alias.name
+
+    def visit_ClassDef(self, node):
+        qualname = self._qualname(node.name)
+        self.classes.append({
+            'name': qualname,
+            'lineno': node.lineno,
+            'end_lineno': node.end_lineno,
+            'bases': [b for b in (_expr_name(base) for base in node.bases) if b],
+        })
+        self.scope.append(('class', node.name))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node):
+        qualname = self._qualname(node.name)
+        self.functions.append({
+            'name': qualname,
+            'short_name': node.name,
+            'lineno': node.lineno,
+            'end_lineno': node.end_lineno,
+            'class': self._innermost('class'),
+        })
+        self.scope.append(('function', node.name))
+        self.generic_visit(node)
+        self.scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node):
+        caller = self._innermost('function')
+        callee = _expr_name(node.func)
+        if caller and callee:
+            self.calls.append([caller, callee, self._innermost('class')])
+        self.generic_visit(node)
+
+
+def parse_source(source, rel_path):
+    """Parse one module into its functions, classes, imports and raw call sites."""
+    module = module_name_from_path(rel_path)
+    tree = ast.parse(source, filename=rel_path)
+    visitor = _ModuleVisitor(module, is_package=rel_path.endswith('__init__.py'))
+    visitor.visit(tree)
+    return {
+        'module': module,
+        'functions': visitor.functions,
+        'classes': visitor.classes,
+        'calls': visitor.calls,
+        'imports': visitor.imports,
+    }
+
+
+def _parse_worker(job):
+    rel_path, source, digest = job
+    try:
+        return rel_path, digest, parse_source(source, rel_path), None
+    except (SyntaxError, ValueError) as e:
+        return rel_path, digest, None, str(e)
+
+
+#---------- content-hash cache
+
+class ParseCache:
+    """One JSON file per parsed source, addressed by the sha1 of its content."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def get(self, digest):
+        try:
+            with open(self._path(digest), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != CACHE_VERSION:
+            return None
+        return entry['result']
+
+    def put(self, digest, result):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'result': result}, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+
+def parse_repository(repo_path, module_path, cache_dir=None, max_workers=None, logger=None):
+    """Return {rel_path: parse result}, re-parsing only files missing from the cache."""
+    cache = ParseCache(cache_dir) if cache_dir else None
+    parsed, jobs = {}, []
+    for rel_path in iter_python_files(repo_path, module_path):
+        with open(os.path.join(repo_path, rel_path), 'rb') as f:
+            raw = f.read()
+        # the module name depends on the path, so it is part of the key
+        digest = hashlib.sha1(rel_path.encode('utf-8') + b'\0' + raw).hexdigest()
+        cached = cache.get(digest) if cache else None
+        if cached is not None:
+            parsed[rel_path] = cached
+            continue
+        try:
+            jobs.append((rel_path, raw.decode('utf-8'), digest))
+        except UnicodeDecodeError as e:
+            if logger:
+                logger.warning(f"Skipping {rel_path} for graph extraction: {e}")
+
+    if len(jobs) >= MIN_FILES_FOR_POOL and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_parse_worker, jobs, chunksize=8))
+    else:
+        results = [_parse_worker(job) for job in jobs]
+
+    for rel_path, digest, result, error in results:
+        if error:
+            if logger:
+                logger.warning(f"Skipping {rel_path} for graph extraction: {error}")
+            continue
+        parsed[rel_path] = result
+        if cache:
+            cache.put(digest, result)
+
+    if logger:
+        logger.info(f"Graph extraction: {len(parsed)} modules, {len(jobs)} parsed, "
+                    f"{len(parsed) - len(jobs)} from cache")
+    return parsed
+
+
+#---------- graph assembly
+
+def build_graph_data(parsed):
+    """Link the per-file parse results into a node-link graph and file_function_map."""
+    nodes, edges = {}, []
+    file_function_map = {}
+    by_short_name = {}
+
+    for rel_path in sorted(parsed):
+        info = parsed[rel_path]
+        module = info['module']
+        nodes[module] = {'id': module, 'label': module, 'type': 'module', 'file': rel_path}
+        for cls in info['classes']:
+            node_id = f"{module}.{cls['name']}"
+            nodes[node_id] = {'id': node_id, 'label': cls['name'], 'type': 'class', 'file': rel_path,
+                              'lineno': cls['lineno'], 'end_lineno': cls['end_lineno']}
+            parent = cls['name'].rsplit('.', 1)[0] if '.' in cls['name'] else None
+            edges.append({'source': f"{module}.{parent}" if parent else module,
+                          'target': node_id, 'type': 'contains'})
+        names = []
+        for func in info['functions']:
+            node_id = f"{module}.{func['name']}"
+            nodes[node_id] = {'id': node_id, 'label': f"{func['name']}()", 'type': 'function', 'file': rel_path,
+                              'lineno': func['lineno'], 'end_lineno': func['end_lineno']}
+            parent = func['name'].rsplit('.', 1)[0] if '.' in func['name'] else None
+            edges.append({'source': f"{module}.{parent}" if parent else module,
+                          'target': node_id, 'type': 'contains'})
+            by_short_name.setdefault(func['short_name'], []).append(node_id)
+            names.append(func['short_name'])
+        file_function_map[rel_path] = names
+
+    def resolve(info, name, enclosing_class):
+        module = info['module']
+        head, _, rest = name.partition('.')
+        if head in ('self', 'cls') and enclosing_class and rest and '.' not in rest:
+            candidate = f"{module}.{enclosing_class}.{rest}"
+            if candidate in nodes:
+                return candidate
+        if not rest:
+            candidate = f"{module}.{name}"
+            if candidate in nodes:
+                return candidate
+        if head in info['imports']:
+            candidate = info['imports'][head] + (f".{rest}" if rest else '')
+            if candidate in nodes:
+                return candidate
+            # calling a class resolves to its constructor
+            if f"{candidate}.__init__" in nodes:
+                return f"{candidate}.__init__"
+        # fall back to a globally unique method/function name
+        matches = by_short_name.get(name.rsplit('.', 1)[-1], [])
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    seen = set()
+    for rel_path in sorted(parsed):
+        info = parsed[rel_path]
+        module = info['module']
+        for caller, callee, enclosing_class in info['calls']:
+            source = f"{module}.{caller}"
+            target = resolve(info, callee, enclosing_class)
+            if target and target != source and (source, target) not in seen:
+                seen.add((source, target))
+                edges.append({'source': source, 'target': target, 'type': 'calls'})
+        for cls in info['classes']:
+            source = f"{module}.{cls['name']}"
+            for base in cls['bases']:
+                target = resolve(info, base, None)
+                if target and nodes[target]['type'] == 'class':
+                    edges.append({'source': source, 'target': target, 'type': 'inherits'})
+
+    graph_data = {'directed': True, 'multigraph': False, 'graph': {},
+                  'nodes': list(nodes.values()), 'edges': edges}
+    return graph_data, file_function_map
+
+
+def to_networkx(graph_data):
+    """Convert the node-link dict into a networkx DiGraph."""
+    import networkx as nx
+
+    graph = nx.DiGraph()
+    graph.add_nodes_from((node['id'], {k: v for k, v in node.items() if k != 'id'})
+                         for node in graph_data['nodes'])
+    graph.add_edges_from((edge['source'], edge['target'], {'type': edge['type']})
+                         for edge in graph_data['edges'])
+    return graph
+
+
+def get_cache_dir(repo_root, repo_path):
+    repo_name = os.path.basename(os.path.normpath(repo_path))
+    return os.path.join(repo_root or repo_path, CACHE_DIR_NAME, repo_name)
+
+
+def build_code_graph(args, max_workers=None):
+    """Build (graph_data, file_function_map) for args.repo_path / args.module_path."""
+    logger = getattr(args, 'logger', None)
+    start = time.time()
+    parsed = parse_repository(args.repo_path, args.module_path,
+                              cache_dir=get_cache_dir(args.repo_root, args.repo_path),
+                              max_workers=max_workers, logger=logger)
+    graph_data, file_function_map = build_graph_data(parsed)
+    if logger:
+        logger.info(f"Built code graph with {len(graph_data['nodes'])} nodes and "
+                    f"{len(graph_data['edges'])} edges in {time.time() - start:.2f}s")
+    return graph_data, file_function_map
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Extract the function/class call graph of a repo.")
+    parser.add_argument("--repo_root", type=str, help="Root directory to the PR repository")
+    parser.add_argument("--repo_path", type=str, required=True, help="Path to the PR repository")
+    parser.add_argument("--module_path", type=str, default='', help="Python module to extract")
+    parser.add_argument("--workers", type=int, default=None, help="Number of parser processes")
+    parser.add_argument("--output", type=str, help="Write the node-link graph JSON here")
+    parser.add_argument("--function_map_output", type=str, help="Write file_function_map JSON here")
+    args = parser.parse_args()
+
+    start = time.time()
+    graph_data, file_function_map = build_code_graph(args, max_workers=args.workers)
+    print(f"{len(graph_data['nodes'])} nodes, {len(graph_data['edges'])} edges, "
+          f"{len(file_function_map)} files in {time.time() - start:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(graph_data, f)
+    if args.function_map_output:
+        with open(args.function_map_output, 'w') as f:
+            json.dump(file_function_map, f, indent=2)
@@ -0,0 +1,363 @@
+"""
+Per-repo lexical retrieval index for finding code related to a PR.
+
+Every function/method in the repository becomes one document made of
+identifier sub-tokens (name, arguments, enclosing class), docstring words and
+character trigrams of the identifiers used in its body. Documents are scored
+with BM25. The index is built once per repository commit and stored as a
+gzip-compressed JSON file, so answering "top-k functions relevant to this
+diff/problem statement" only costs a few postings-list scans.
+"""
+
+import argparse
+import ast
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+import time
+from collections import Counter, defaultdict
+
+
+INDEX_VERSION = 1
+INDEX_DIR_NAME = '.lexical_index'
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# the function name is the strongest signal, so it is counted several times
+NAME_WEIGHT = 3
+# trigrams that appear in more than this fraction of documents carry almost no
+# information but make up most of the postings, so they are dropped at build time
+TRIGRAM_MAX_DF = 0.1
+TRIGRAM_PREFIX = '#'
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'this', 'that', 'from', 'are', 'was', 'not',
+    'but', 'you', 'can', 'all', 'any', 'has', 'have', 'will', 'when', 'which',
+    'should', 'into', 'its', 'than', 'then', 'there', 'these', 'those', 'also',
+    'def', 'self', 'cls', 'return', 'import', 'none', 'true', 'false', 'class',
+    'elif', 'else', 'raise', 'pass', 'lambda', 'yield', 'try', 'except',
+    'finally', 'while', 'isinstance', 'args', 'kwargs', 'str', 'int', 'len',
+}
+
+
+#---------- tokenization
+
+def split_identifier(identifier):
+    """Split a snake_case / CamelCase identifier into lowercase sub-tokens."""
+    tokens = []
+    for part in identifier.split('_'):
+        if not part:
+            continue
+        tokens.extend(sub.lower() for sub in CAMEL_RE.findall(part))
+    lowered = identifier.strip('_').lower()
+    if lowered and lowered not in tokens:
+        tokens.append(lowered)
+    return [tok for tok in tokens if len(tok) > 1 and tok not in STOPWORDS]
+
+
+def identifier_trigrams(identifier):
+    """Character trigrams of an identifier, prefixed to keep them apart from words."""
+    word = identifier.strip('_').lower()
+    if len(word) < 3:
+        return []
+    return [TRIGRAM_PREFIX + word[i:i + 3] for i in range(len(word) - 2)]
+
+
+def tokenize_text(text, with_trigrams=False):
+    """Tokenize free text (docstrings, problem statements, diffs)."""
+    tokens = []
+    for identifier in IDENTIFIER_RE.findall(text):
+        tokens.extend(split_identifier(identifier))
+        if with_trigrams:
+            tokens.extend(identifier_trigrams(identifier))
+    return tokens
+
+
+#---------- document extraction
+
+class _FunctionCollector(ast.NodeVisitor):
+    """Collect one document per function/method in a module."""
+
+    def __init__(self, rel_path):
+        self.rel_path = rel_path
+        self.scope = []
+        self.docs = []
+
+    def visit_ClassDef(self, node):
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    def visit_FunctionDef(self, node):
+        qualname = '.'.join(self.scope + [node.name])
+        terms = Counter()
+
+        name_tokens = split_identifier(node.name)
+        for _ in range(NAME_WEIGHT):
+            terms.update(name_tokens)
+        for scope_name in self.scope:
+            terms.update(split_identifier(scope_name))
+        for arg in node.args.args + node.args.kwonlyargs:
+            terms.update(split_identifier(arg.arg))
+
+        docstring = ast.get_docstring(node)
+        if docstring:
+            terms.update(tokenize_text(docstring))
+
+        body_identifiers = set()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                body_identifiers.add(child.id)
+            elif isinstance(child, ast.Attribute):
+                body_identifiers.add(child.attr)
+        for identifier in body_identifiers:
+            terms.update(split_identifier(identifier))
+            terms.update(set(identifier_trigrams(identifier)))
+
+        self.docs.append({
+            'file': self.rel_path,
+            'name': qualname,
+            'lineno': node.lineno,
+            'terms': terms,
+        })
+
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+
+def iter_python_files(repo_path, module_path):
+    """Yield the python files of the module, relative to the repo root."""
+    module_root = os.path.join(repo_path, module_path) if module_path else repo_path
+    for dirpath, dirnames, filenames in os.walk(module_root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d != '__pycache__')
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                yield os.path.relpath(os.path.join(dirpath, filename), repo_path)
+
+
+def extract_documents(repo_path, module_path, logger=None):
+    docs = []
+    for rel_path in iter_python_files(repo_path, module_path):
+        try:
+            with open(os.path.join(repo_path, rel_path), 'r', encoding='utf-8') as f:
+                tree = ast.parse(f.read(), filename=rel_path)
+        except (SyntaxError, UnicodeDecodeError, ValueError) as e:
+            if logger:
+                logger.warning(f"Skipping {rel_path} for lexical index: {e}")
+            continue
+        collector = _FunctionCollector(rel_path)
+        collector.visit(tree)
+        docs.extend(collector.docs)
+    return docs
+
+
+#---------- the index
+
+class LexicalIndex:
+    """BM25 inverted index over the functions of one repository snapshot."""
+
+    def __init__(self, docs, doc_lengths, postings, commit=None):
+        self.docs = docs                  # list of [file, qualname, lineno]
+        self.doc_lengths = doc_lengths    # list of int
+        self.postings = postings          # term -> (doc_ids, term_freqs)
+        self.commit = commit
+        self.num_docs = len(docs)
+        self.avg_doc_length = (sum(doc_lengths) / self.num_docs) if self.num_docs else 0.0
+        self._idf = {}
+
+    @classmethod
+    def build(cls, repo_path, module_path, commit=None, logger=None):
+        raw_docs = extract_documents(repo_path, module_path, logger)
+
+        postings = defaultdict(lambda: ([], []))
+        docs, doc_lengths = [], []
+        for doc_id, doc in enumerate(raw_docs):
+            docs.append([doc['file'], doc['name'], doc['lineno']])
+            doc_lengths.append(sum(doc['terms'].values()))
+            for term, freq in doc['terms'].items():
+                doc_ids, freqs = postings[term]
+                doc_ids.append(doc_id)
+                freqs.append(freq)
+
+        max_trigram_df = max(1, int(TRIGRAM_MAX_DF * len(docs)))
+        postings = {
+            term: entry for term, entry in postings.items()
+            if not (term.startswith(TRIGRAM_PREFIX) and len(entry[0]) > max_trigram_df)
+        }
+        return cls(docs, doc_lengths, postings, commit)
+
+    def idf(self, term):
+        if term not in self._idf:
+            df = len(self.postings[term][0])
+            self._idf[term] = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+        return self._idf[term]
+
+    def query(self, text, k=20):
+        """Return the top-k functions as dicts sorted by descending BM25 score."""
+        query_terms = set(tokenize_text(text, with_trigrams=True))
+        scores = defaultdict(float)
+        avg_len = self.avg_doc_length or 1.0
+        for term in query_terms:
+            if term not in self.postings:
+                continue
+            idf = self.idf(term)
+            doc_ids, freqs = self.postings[term]
+            for doc_id, freq in zip(doc_ids, freqs):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_len)
+                scores[doc_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+
+        top = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [
+            {
+                'file': self.docs[doc_id][0],
+                'function': self.docs[doc_id][1],
+                'lineno': self.docs[doc_id][2],
+                'score': round(score, 4),
+            }
+            for doc_id, score in top
+        ]
+
+    def save(self, path):
+        # doc ids are delta-encoded so the gzip stream stays small
+        encoded = {}
+        for term, (doc_ids, freqs) in self.postings.items():
+            deltas = [doc_ids[0]] + [b - a for a, b in zip(doc_ids, doc_ids[1:])]
+            encoded[term] = [deltas, freqs]
+        payload = {
+            'version': INDEX_VERSION,
+            'commit': self.commit,
+            'docs': self.docs,
+            'doc_lengths': self.doc_lengths,
+            'postings': encoded,
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            payload = json.load(f)
+        if payload.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported lexical index version in {path}")
+        postings = {}
+        for term, (deltas, freqs) in payload['postings'].items():
+            doc_ids, current = [], 0
+            for delta in deltas:
+                current += delta
+                doc_ids.append(current)
+            postings[term] = (doc_ids, freqs)
+        return cls(payload['docs'], payload['doc_lengths'], postings, payload.get('commit'))
+
+
+#---------- snapshot identification and caching
+
+def get_repo_commit(repo_path):
+    """Return the HEAD commit of the repo, or a fingerprint of its python files."""
+    try:
+        result = subprocess.run(['git', '-C', repo_path, 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True, check=True)
+        commit = result.stdout.strip()
+        # uncommitted edits are keyed by their content, not just the names of the changed files
+        diff = subprocess.run(['git', '-C', repo_path, 'diff', 'HEAD', '--', '*.py'],
+                              capture_output=True, check=True).stdout
+        untracked = subprocess.run(['git', '-C', repo_path, 'ls-files', '-z', '--others',
+                                    '--exclude-standard', '--', '*.py'],
+                                   capture_output=True, text=True, check=True).stdout
+        untracked = sorted(filter(None, untracked.split('\0')))
+        if not diff and not untracked:
+            return commit
+        fingerprint = hashlib.sha1(diff)
+        for rel_path in untracked:
+            fingerprint.update(rel_path.encode('utf-8') + b'\0')
+            with open(os.path.join(repo_path, rel_path), 'rb') as f:
+                fingerprint.update(f.read())
+        return commit + '-' + fingerprint.hexdigest()[:8]
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    fingerprint = hashlib.sha1()
+    for rel_path in iter_python_files(repo_path, ''):
+        stat = os.stat(os.path.join(repo_path, rel_path))
+        fingerprint.update(f"{rel_path}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return 'fs-' + fingerprint.hexdigest()[:16]
+
+
+def get_index_path(repo_root, repo_path, module_path, commit):
+    repo_name = os.path.basename(os.path.normpath(repo_path))
+    module_tag = (module_path or 'all').replace(os.sep, '.')
+    return os.path.join(repo_root or repo_path, INDEX_DIR_NAME,
+                        f"{repo_name}-{module_tag}-{commit}.json.gz")
+
+
+def load_or_build_index(repo_root, repo_path, module_path, rebuild=False, logger=None):
+    """Load the index for the current repo commit, building it on first use."""
+    commit = get_repo_commit(repo_path)
+    index_path = get_index_path(repo_root, repo_path, module_path, commit)
+
+    if not rebuild and os.path.exists(index_path):
+        start = time.time()
+        index = LexicalIndex.load(index_path)
+        if logger:
+            logger.info(f"Loaded lexical index ({index.num_docs} functions) in {time.time() - start:.2f}s")
+        return index
+
+    start = time.time()
+    index = LexicalIndex.build(repo_path, module_path, commit=commit, logger=logger)
+    index.save(index_path)
+    if logger:
+        logger.info(f"Built lexical index ({index.num_docs} functions, {len(index.postings)} terms) "
+                    f"in {time.time() - start:.2f}s -> {index_path}")
+    return index
+
+
+def find_related_functions(args, patch, problem_statement, k=None):
+    """Top-k functions related to the PR, used as the architect's candidate set."""
+    logger = getattr(args, 'logger', None)
+    index = load_or_build_index(args.repo_root, args.repo_path, args.module_path,
+                                rebuild=getattr(args, 'update_lexical_index', False),
+                                logger=logger)
+    start = time.time()
+    candidates = index.query(problem_statement + '\n' + patch,
+                             k=k or getattr(args, 'lexical_topk', 20))
+    if logger:
+        logger.info(f"Lexical retrieval returned {len(candidates)} candidates in "
+                    f"{(time.time() - start) * 1000:.1f}ms")
+    return candidates
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build or query the lexical retrieval index of a repo.")
+    parser.add_argument("--repo_root", type=str, help="Root directory to the PR repository")
+    parser.add_argument("--repo_path", type=str, required=True, help="Path to the PR repository")
+    parser.add_argument("--module_path", type=str, default='', help="Python module to index")
+    parser.add_argument("--query", type=str, help="Text (or path to a file) to search for")
+    parser.add_argument("--topk", type=int, default=20, help="Number of results to return")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index even if cached")
+    args = parser.parse_args()
+
+    index = load_or_build_index(args.repo_root, args.repo_path, args.module_path, rebuild=args.rebuild)
+    print(f"Index: {index.num_docs} functions, {len(index.postings)} terms, commit {index.commit}")
+
+    if args.query:
+        text = args.query
+        if os.path.isfile(text):
+            with open(text, 'r') as f:
+                text = f.read()
+        for hit in index.query(text, k=args.topk):
+            print(f"{hit['score']:8.3f}  {hit['file']}:{hit['lineno']}  {hit['function']}")
@@ -0,0 +1,381 @@
+"""
+Record/replay of LLM HTTP traffic for deterministic offline runs.
+
+In record mode every request sent through `requests` or `httpx` (the
+transports used by the GenAI/OpenAI clients) is forwarded as usual and the
+request/response pair is appended to a cassette. In replay mode responses are
+served from the cassette, with either the recorded or zero latency, so the
+full pipeline can be benchmarked and regression-tested without network access.
+
+A cassette is two files: `<path>` holds length-prefixed zlib-compressed JSON
+records, `<path>.idx` maps each request key to the offsets of its records.
+Identical requests are replayed in the order they were recorded. Recording
+appends to an existing cassette; a cassette must have a single writer, so
+parallel recorders write one cassette each and `merge_cassettes` combines them.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+MODES = ('off', 'record', 'replay')
+LATENCY_MODES = ('recorded', 'zero')
+
+_RECORD_HEADER = struct.Struct('>I')
+# request bodies sent to auth endpoints or carrying credentials are not stored;
+# the request key (a hash) is all replay needs
+_AUTH_PATH_RE = re.compile(r'(^|/)(oauth2?|token|auth|login)(/|$)', re.IGNORECASE)
+_CREDENTIAL_RE = re.compile(r'(client_secret|password)["\']?\s*[=:]', re.IGNORECASE)
+
+_active = None
+_install_lock = threading.Lock()
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def request_key(method, url, body):
+    """Stable key of a request: method, url and body with JSON key order normalized."""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    body = body or b''
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        pass
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode('utf-8') + b' ' + str(url).encode('utf-8') + b'\n')
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class Cassette:
+
+    def __init__(self, path, mode='replay', latency='zero'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if latency not in LATENCY_MODES:
+            raise ValueError(f"Unknown replay latency mode: {latency}")
+        self.path = path
+        self.index_path = path + '.idx'
+        self.mode = mode
+        self.latency = latency
+        self.index = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.recorded = 0
+
+        if mode == 'replay':
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Cassette not found: {path}")
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        elif mode == 'record':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # extend an existing cassette instead of truncating it
+            if os.path.exists(path) and os.path.exists(self.index_path):
+                with open(self.index_path, 'r') as f:
+                    self.index = json.load(f)
+            else:
+                open(path, 'wb').close()
+            self._flush_index()
+
+    def _flush_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def record(self, key, request, response, elapsed, flush=True):
+        payload = zlib.compress(json.dumps({
+            'request': request,
+            'response': response,
+            'elapsed': elapsed,
+        }, separators=(',', ':')).encode('utf-8'))
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(_RECORD_HEADER.pack(len(payload)))
+                f.write(payload)
+            self.index.setdefault(key, []).append(offset)
+            self.recorded += 1
+            if flush:
+                self._flush_index()
+
+    def flush(self):
+        with self._lock:
+            self._flush_index()
+
+    def _read_at(self, f, offset):
+        f.seek(offset)
+        (size,) = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+        return json.loads(zlib.decompress(f.read(size)))
+
+    def lookup(self, key, method, url):
+        with self._lock:
+            offsets = self.index.get(key)
+            if not offsets:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for {method} {url}")
+            position = self._cursor.get(key, 0)
+            # once exhausted, keep serving the last recording
+            self._cursor[key] = min(position + 1, len(offsets) - 1)
+            self.hits += 1
+            with open(self.path, 'rb') as f:
+                entry = self._read_at(f, offsets[position])
+        return entry
+
+    def entries(self):
+        """Iterate over (key, entry) pairs in file order."""
+        keyed = sorted((offset, key) for key, offsets in self.index.items() for offset in offsets)
+        with open(self.path, 'rb') as f:
+            for offset, key in keyed:
+                yield key, self._read_at(f, offset)
+
+    def replay_delay(self, entry):
+        return entry['elapsed'] if self.latency == 'recorded' else 0.0
+
+    def stats(self):
+        return {'mode': self.mode, 'hits': self.hits, 'misses': self.misses, 'recorded': self.recorded}
+
+    def __iter__(self):
+        """Iterate over all recorded entries in file order."""
+        with open(self.path, 'rb') as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if not header:
+                    break
+                (size,) = _RECORD_HEADER.unpack(header)
+                yield json.loads(zlib.decompress(f.read(size)))
+
+
+def _serialize_body(body):
+    if body is None:
+        return ''
+    if isinstance(body, bytes):
+        return body.decode('utf-8', errors='replace')
+    return str(body)
+
+
+def _recorded_body(url, body):
+    """Request body as stored in the cassette, with credentials redacted."""
+    text = _serialize_body(body)
+    if _AUTH_PATH_RE.search(urlsplit(str(url)).path) or _CREDENTIAL_RE.search(text):
+        return '[redacted]'
+    return text
+
+
+#---------- requests transport
+
+def _patch_requests(cassette):
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from requests.structures import CaseInsensitiveDict
+    except ImportError:
+        return None
+
+    original_send = HTTPAdapter.send
+
+    def send(adapter, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        if cassette.mode == 'replay':
+            entry = cassette.lookup(key, request.method, request.url)
+            time.sleep(cassette.replay_delay(entry))
+            recorded = entry['response']
+            response = requests.Response()
+            response.status_code = recorded['status']
+            response.headers = CaseInsensitiveDict(recorded['headers'])
+            response._content = recorded['body'].encode('utf-8')
+            response.encoding = 'utf-8'
+            response.url = request.url
+            response.request = request
+            response.connection = adapter
+            return response
+
+        start = time.perf_counter()
+        response = original_send(adapter, request, **kwargs)
+        content = response.content
+        cassette.record(key,
+                        {'method': request.method, 'url': request.url,
+                         'body': _recorded_body(request.url, request.body)},
+                        {'status': response.status_code, 'headers': dict(response.headers),
+                         'body': content.decode('utf-8', errors='replace')},
+                        time.perf_counter() - start)
+        return response
+
+    HTTPAdapter.send = send
+    return lambda: setattr(HTTPAdapter, 'send', original_send)
+
+
+#---------- httpx transports (sync and async)
+
+def _patch_httpx(cassette):
+    try:
+        import httpx
+    except ImportError:
+        return None
+
+    original_sync = httpx.HTTPTransport.handle_request
+    original_async = httpx.AsyncHTTPTransport.handle_async_request
+
+    def replayed(request, entry):
+        recorded = entry['response']
+        headers = {k: v for k, v in recorded['headers'].items()
+                   if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+        return httpx.Response(recorded['status'], headers=headers,
+                              content=recorded['body'].encode('utf-8'), request=request)
+
+    def record(request, response, body, elapsed):
+        cassette.record(request_key(request.method, request.url, request.content),
+                        {'method': request.method, 'url': str(request.url),
+                         'body': _recorded_body(request.url, request.content)},
+                        {'status': response.status_code, 'headers': dict(response.headers),
+                         'body': body.decode('utf-8', errors='replace')},
+                        elapsed)
+
+    def handle_request(transport, request):
+        if cassette.mode == 'replay':
+            entry = cassette.lookup(request_key(request.method, request.url, request.content),
+                                    request.method, request.url)
+            time.sleep(cassette.replay_delay(entry))
+            return replayed(request, entry)
+
+        start = time.perf_counter()
+        response = original_sync(transport, request)
+        body = response.read()
+        record(request, response, body, time.perf_counter() - start)
+        return replayed(request, {'response': {'status': response.status_code,
+                                               'headers': dict(response.headers),
+                                               'body': body.decode('utf-8', errors='replace')}})
+
+    async def handle_async_request(transport, request):
+        if cassette.mode == 'replay':
+            entry = cassette.lookup(request_key(request.method, request.url, request.content),
+                                    request.method, request.url)
+            await asyncio.sleep(cassette.replay_delay(entry))
+            return replayed(request, entry)
+
+        start = time.perf_counter()
+        response = await original_async(transport, request)
+        body = await response.aread()
+        record(request, response, body, time.perf_counter() - start)
+        return replayed(request, {'response': {'status': response.status_code,
+                                               'headers': dict(response.headers),
+                                               'body': body.decode('utf-8', errors='replace')}})
+
+    httpx.HTTPTransport.handle_request = handle_request
+    httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
+
+    def restore():
+        httpx.HTTPTransport.handle_request = original_sync
+        httpx.AsyncHTTPTransport.handle_async_request = original_async
+    return restore
+
+
+#---------- merging
+
+def merge_cassettes(path, sources, remove=True):
+    """Append the records of the `sources` cassettes to the cassette at `path`."""
+    target = Cassette(path, mode='record')
+    for source_path in sources:
+        source = Cassette(source_path, mode='replay')
+        for key, entry in source.entries():
+            target.record(key, entry['request'], entry['response'], entry['elapsed'], flush=False)
+        # the index is written once per source instead of once per entry
+        target.flush()
+        if remove:
+            os.remove(source_path)
+            os.remove(source.index_path)
+    return target
+
+
+def worker_cassette_path(path, pid=None):
+    """Per-process cassette of a parallel recording, merged into `path` afterwards."""
+    return f"{path}.{pid or os.getpid()}"
+
+
+def worker_cassettes(path):
+    """Per-process cassettes recorded for `path` that are still waiting to be merged."""
+    prefix = os.path.basename(path) + '.'
+    directory = os.path.dirname(path) or '.'
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+
+#---------- activation
+
+def install(path, mode='replay', latency='zero'):
+    """Activate a cassette process-wide. Returns it, or None when mode is 'off'."""
+    global _active
+    if mode == 'off':
+        return None
+    if not path:
+        raise ValueError(f"Cassette mode '{mode}' needs a cassette path")
+    with _install_lock:
+        if _active is not None:
+            raise RuntimeError(f"A cassette is already active: {_active[0].path}")
+        cassette = Cassette(path, mode=mode, latency=latency)
+        restorers = [r for r in (_patch_requests(cassette), _patch_httpx(cassette)) if r]
+        _active = (cassette, restorers)
+    return cassette
+
+
+def uninstall():
+    """Deactivate the current cassette and restore the original transports."""
+    global _active
+    with _install_lock:
+        if _active is None:
+            return None
+        cassette, restorers = _active
+        for restore in restorers:
+            restore()
+        _active = None
+    return cassette
+
+
+def active_cassette():
+    return _active[0] if _active else None
+
+
+@contextmanager
+def use_cassette(path, mode='replay', latency='zero'):
+    cassette = install(path, mode=mode, latency=latency)
+    try:
+        yield cassette
+    finally:
+        if cassette is not None:
+            uninstall()
+
+
+def add_cassette_args(parser):
+    parser.add_argument("--llm_cassette", type=str, help="Cassette file for recording/replaying LLM calls")
+    parser.add_argument("--llm_cassette_mode", type=str, default='off', choices=MODES,
+                        help="Record LLM calls to the cassette or replay them from it")
+    parser.add_argument("--replay_latency", type=str, default='zero', choices=LATENCY_MODES,
+                        help="Serve replayed responses with the recorded or zero latency")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Inspect an LLM cassette.")
+    parser.add_argument("cassette", type=str, help="Path to the cassette file")
+    args = parser.parse_args()
+
+    total_elapsed = 0.0
+    for i, entry in enumerate(Cassette(args.cassette, mode='replay')):
+        total_elapsed += entry['elapsed']
+        print(f"{i:4d}  {entry['response']['status']}  {entry['elapsed']:7.2f}s  "
+              f"{entry['request']['method']} {entry['request']['url']}")
+    print(f"Total recorded latency: {total_elapsed:.2f}s")
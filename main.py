@@ -1,11 +1,11 @@
 import argparse
-from utils.logger import set_logger
-from query_routing_agent import query_routing_single, load_routing_examples, \
-    parse_response, parse_routing_decision
-from query_architect_agent import query_architect_agent_single
-from query_code_review_agent import query_code_review_single
-from query_test_generation_agent import query_test_generation_single
-import genai_sample_util
+import time
+from model_tiering import run_cascade
+from profiling import span, start_profile, finish_profile, add_profile_args
+import llm_cassette
+
+# The agent, graph and GenAI modules are heavy to import, so they are imported
+# lazily inside main_worker and only for the steps that actually run.
 
 
 
@@ -34,33 +34,46 @@ def main_worker(args, logger, pr_data, access_token):
     test_patch = pr_data['test_patch']
 
     args.logger = logger
+    args.pr_outcome = {}
     send_back = False
 
     #---------- query the PR routing agent
-    routing_model = 'gpt-4o'
     logger.info(f".......... Running PR Routing Agent ..........")
     if args.skip_routing:
         logger.info("Skipping Routing Agent.")
         pass
     else:
+        from query_routing_agent import query_routing_single, load_routing_examples, \
+            parse_response, parse_routing_decision
         args.strategy = '2' # 1-shot in-context learning for Routing Agent
 
-        easy_examples, hard_examples = load_routing_examples()
-        query, response = query_routing_single(args, access_token,
-                                            routing_model,
-                                            patch,
-                                            problem_statement,
-                                            easy_examples,
-                                            hard_examples
-                                            )
-        # parse routing response for different model
-        response = parse_response(routing_model, response)
+        with span(args, 'prompt_build'):
+            easy_examples, hard_examples = load_routing_examples()
+
+        def query_routing(routing_model):
+            query, response = query_routing_single(args, access_token,
+                                                routing_model,
+                                                patch,
+                                                problem_statement,
+                                                easy_examples,
+                                                hard_examples
+                                                )
+            # parse routing response for different model
+            with span(args, 'parse'):
+                response = parse_response(routing_model, response)
+                is_easy, reason = parse_routing_decision(response)
+            return query, response, is_easy, reason
+
+        # escalate when the verdict could not be extracted
+        query, response, is_easy, reason = run_cascade(
+            args, 'routing', query_routing,
+            accept_fn=lambda result: result[2] in (True, False) and bool(result[3]))
 
         if args.verbose:
             logger.info(f"Query:\n{query}")
             logger.info(f"Response:\n{response}")
 
-        is_easy, reason = parse_routing_decision(response)
+        args.pr_outcome['routing'] = {'is_easy': is_easy, 'reason': reason}
         if not is_easy:
             send_back = True
             logger.info(f"This PR requires human review. Reasons: {reason}")
@@ -70,24 +83,62 @@ def main_worker(args, logger, pr_data, access_token):
             logger.info(f"Reasons: {reason}")
 
 
+    #---------- retrieve lexically related functions as a bounded candidate set for the architect
+    args.lexical_candidates = []
+    if args.lexical_topk > 0 and not args.skip_architect:
+        from lexical_index import find_related_functions
+        with span(args, 'graph_query', kind='lexical'):
+            args.lexical_candidates = find_related_functions(args, patch, problem_statement)
+        if args.verbose:
+            for hit in args.lexical_candidates:
+                logger.info(f"Related: {hit['file']}:{hit['lineno']} {hit['function']} ({hit['score']})")
+
+    #---------- extract the call graph natively, re-parsing only changed files
+    if args.update_kd_graph:
+        from graph_extraction import build_code_graph, to_networkx
+        from graph_centrality import get_centrality
+        with span(args, 'graph_query', kind='call_graph'):
+            graph_data, args.file_function_map = build_code_graph(args, max_workers=args.graph_workers)
+            args.kd_graph = to_networkx(graph_data)
+        # precomputed per graph snapshot, warm-started when only a few edges changed
+        with span(args, 'graph_query', kind='centrality'):
+            args.centrality = get_centrality(args, graph_data)
+        if args.verbose:
+            logger.info(f"Most central functions: {args.centrality.top_k(10)}")
+
     #---------- query the PR architect agent
-    architect_model = 'gpt-4o'
     logger.info(f".......... Running PR Architect Agent ..........")
-    architect_info, kd_graph, file_function_map = query_architect_agent_single(args, access_token,
+    from query_architect_agent import query_architect_agent_single
+    # with --update_kd_graph the natively extracted graph is on args.kd_graph /
+    # args.file_function_map, for the architect to use instead of its own pydeps build
+    architect_info, kd_graph, file_function_map = run_cascade(
+        args, 'architect',
+        lambda architect_model: query_architect_agent_single(args, access_token,
                                                 architect_model,
                                                 patch,
-                                                problem_statement)
+                                                problem_statement),
+        accept_fn=lambda result: bool(result[0]))
+    if kd_graph is None and args.update_kd_graph:
+        kd_graph, file_function_map = args.kd_graph, args.file_function_map
+    if kd_graph is not None and args.update_kd_graph:
+        # downstream agents look scores up instead of recomputing them per PR
+        from graph_centrality import attach_scores
+        kd_graph = attach_scores(kd_graph, args.centrality)
 
     #---------- query the PR code review agent
-    code_review_model = 'gpt-4o'
     logger.info(f".......... Running PR Code Review Agent ..........")
     if not args.skip_review:
-        overall_good, reasons = query_code_review_single(args, access_token,
+        from query_code_review_agent import query_code_review_single
+        overall_good, reasons = run_cascade(
+            args, 'review',
+            lambda code_review_model: query_code_review_single(args, access_token,
                                         code_review_model,
                                         patch,
                                         problem_statement,
                                         architect_info
-                                        )
+                                        ),
+            accept_fn=lambda result: isinstance(result[0], bool))
+        args.pr_outcome['review'] = {'overall_good': overall_good, 'reasons': reasons}
         if overall_good:
             logger.info(f"Congratulations! Your PR passed code review.")
         else:
@@ -99,9 +150,11 @@ def main_worker(args, logger, pr_data, access_token):
         logger.info("Skipping Code Review Agent.")
 
     #---------- query the Test Generation agent
-    test_gen_model = 'gpt-4o'
     logger.info(f".......... Running PR Test Generation Agent ..........")
-    new_test_case_list = query_test_generation_single(args, access_token,
+    from query_test_generation_agent import query_test_generation_single
+    new_test_case_list = run_cascade(
+        args, 'test_generation',
+        lambda test_gen_model: query_test_generation_single(args, access_token,
                                        test_gen_model,
                                        test_patch,
                                        patch,
@@ -109,15 +162,17 @@ def main_worker(args, logger, pr_data, access_token):
                                        architect_info,
                                        kd_graph,
                                        file_function_map
-                                       )
+                                       ),
+        accept_fn=lambda result: bool(result))
+    args.pr_outcome['test_generation'] = {'num_test_cases': len(new_test_case_list or [])}
 
+    logger.info(f"Model tiers used: {args.model_tiers}")
     return send_back
 
 
-if __name__ == "__main__":
-
+def build_arg_parser(description="Process some data."):
     # define the argument parser
-    parser = argparse.ArgumentParser(description="Process some data.")
+    parser = argparse.ArgumentParser(description=description)
     parser.add_argument("--input", type=str, help="Input PR file path")
     parser.add_argument("--repo_root", type=str, help="Root directory to the PR repository")
     parser.add_argument("--repo_path", type=str, help="Path to the PR repository")
@@ -129,21 +184,52 @@ if __name__ == "__main__":
     parser.add_argument("--skip_review", action="store_true", help="Skip code review agent, for fast code evaluation")
     parser.add_argument("--update_deps_graph", action="store_true", help="Update the dependencies graph")
     parser.add_argument("--update_kd_graph", action="store_true", help="Update the knowledge graph")
+    parser.add_argument("--graph_workers", type=int, default=None, help="Number of processes for call-graph extraction")
     parser.add_argument("--hop", type=int, default=1, help="How many hops away to search for relevant files")
+    parser.add_argument("--lexical_topk", type=int, default=0, help="Number of lexically related functions to retrieve for the architect, 0 to disable")
+    parser.add_argument("--update_lexical_index", action="store_true", help="Rebuild the lexical retrieval index")
+    parser.add_argument("--routing_models", type=str, help="Comma-separated model cascade for the routing agent, cheapest first")
+    parser.add_argument("--architect_models", type=str, help="Comma-separated model cascade for the architect agent")
+    parser.add_argument("--review_models", type=str, help="Comma-separated model cascade for the code review agent")
+    parser.add_argument("--test_generation_models", type=str, help="Comma-separated model cascade for the test generation agent")
     parser.add_argument("--prefix", type=str, help="Prefix for log files")
     parser.add_argument("--log_mode", type=str, default="both", help="Logging mode: file, console, or both")
+    llm_cassette.add_cassette_args(parser)
+    add_profile_args(parser)
+    return parser
+
+
+if __name__ == "__main__":
 
+    startup_start = time.time()
+
+    parser = build_arg_parser()
     args = parser.parse_args()
 
     # set the logger
+    from utils.logger import set_logger
     logger = set_logger(args)
 
     # load the PR
     pr_data = load_pr_data(args.input)
     logger.info(f"Loaded PR data: {args.input}")
 
+    # record or replay all LLM traffic, including the token request
+    cassette = llm_cassette.install(args.llm_cassette, args.llm_cassette_mode, args.replay_latency)
+    if cassette:
+        logger.info(f"LLM cassette {cassette.path} active in {cassette.mode} mode")
+
     # get the token ready for GenAI
+    import genai_sample_util
     access_token  = genai_sample_util.get_genai_token()
+    logger.info(f"Startup completed in {time.time() - startup_start:.2f}s")
 
+    # optionally sample the review and record a timeline of its steps
+    start_profile(args)
     send_back = main_worker(args, logger, pr_data, access_token)
-    logger.info(f"PR Review Completed!")
\ No newline at end of file
+    logger.info(f"PR Review Completed!")
+    finish_profile(args, logger)
+
+    if cassette:
+        llm_cassette.uninstall()
+        logger.info(f"LLM cassette stats: {cassette.stats()}")
\ No newline at end of file
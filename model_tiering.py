@@ -0,0 +1,79 @@
+"""
+Per-step model tiering with confidence-based escalation.
+
+Each pipeline step has an ordered list of models, cheapest first. A step is
+answered by the first model whose parsed output is well-formed and confident
+enough; otherwise it escalates to the next tier. Which tier answered is
+recorded per step so latency and cost savings can be measured.
+"""
+
+import time
+
+from profiling import span
+
+
+# cheapest model first, the last entry is the model of last resort;
+# the backend's Settings default to these as well
+DEFAULT_STEP_MODELS = {
+    'routing': ['gpt-4o-mini', 'gpt-4o'],
+    'architect': ['gpt-4o-mini', 'gpt-4o'],
+    'review': ['gpt-4o'],
+    'test_generation': ['gpt-4o'],
+}
+DEFAULT_MIN_CONFIDENCE = 0.7
+
+
+def parse_model_list(spec):
+    """'gpt-4o-mini,gpt-4o' -> ['gpt-4o-mini', 'gpt-4o']"""
+    return [model.strip() for model in spec.split(',') if model.strip()]
+
+
+def get_step_models(args, step):
+    """Models configured for a step, from --<step>_models or the defaults."""
+    spec = getattr(args, f'{step}_models', None)
+    return parse_model_list(spec) if spec else list(DEFAULT_STEP_MODELS[step])
+
+
+def run_cascade(args, step, query_fn, accept_fn=None):
+    """
+    Call `query_fn(model)` for each tier until `accept_fn(result)` passes.
+
+    `accept_fn` returns False or raises (e.g. the verdict could not be parsed)
+    for low-confidence or malformed answers. The answer of the last tier is
+    always returned. The tier record is stored in `args.model_tiers[step]`.
+    """
+    logger = getattr(args, 'logger', None)
+    models = get_step_models(args, step)
+    attempts = []
+    result = None
+
+    for tier, model in enumerate(models):
+        is_last = tier == len(models) - 1
+        start = time.time()
+        accepted, reason = True, None
+        try:
+            with span(args, step, model=model, tier=tier):
+                result = query_fn(model)
+            if accept_fn is not None and not is_last:
+                accepted = bool(accept_fn(result))
+                reason = None if accepted else 'low confidence'
+        except Exception as e:
+            if is_last:
+                raise
+            accepted, reason = False, f"{type(e).__name__}: {e}"
+
+        attempts.append({'model': model, 'tier': tier, 'latency': round(time.time() - start, 3),
+                         'accepted': accepted, 'reason': reason})
+        if accepted:
+            break
+        if logger:
+            logger.info(f"{step}: {model} answer rejected ({reason}), escalating to {models[tier + 1]}")
+
+    record = {'model': attempts[-1]['model'], 'tier': attempts[-1]['tier'],
+              'escalated': len(attempts) > 1, 'attempts': attempts}
+    if not hasattr(args, 'model_tiers'):
+        args.model_tiers = {}
+    args.model_tiers[step] = record
+    if logger:
+        logger.info(f"{step} answered by {record['model']} (tier {record['tier']})")
+    return result
@@ -0,0 +1,297 @@
+"""
+On-demand profiling of a single PR review.
+
+A Profiler combines a sampling profiler with a timeline of named spans.
+
+The sampler is a background thread. Every few milliseconds it snapshots the
+stack of the profiled thread via `sys._current_frames`, so the profiled code
+needs no instrumentation. Spans (prompt build, LLM wait, parse, graph queries,
+...) record wall-clock intervals, including the time spent waiting on the
+network, where there is nothing to sample.
+
+Each sample is prefixed with the spans that were open when it was taken, so
+the flamegraph shows where CPU time went within each span. Profiles export to
+speedscope JSON (https://www.speedscope.app) and to folded stacks for
+flamegraph.pl / inferno.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+
+DEFAULT_INTERVAL = 0.005
+MAX_STACK_DEPTH = 128
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+
+class Profiler:
+    """Sampling profile plus span timeline of one thread."""
+
+    def __init__(self, name='pr_review', interval=DEFAULT_INTERVAL, sample_filter=None):
+        """
+        `sample_filter` is an optional callable run on the sampler thread;
+        ticks where it returns False are skipped (e.g. while the event loop
+        runs another workflow's task).
+        """
+        self.name = name
+        self.interval = interval
+        self.sample_filter = sample_filter
+        self.thread_id = None
+        self.started = None
+        self.stopped = None
+
+        self.frames = []            # [(function, file, line)]
+        self._frame_index = {}
+        self.samples = []           # [(time, stack of frame indices, root first, weight)]
+        self.spans = []             # [{'name', 'lane', 'start', 'end', 'meta'}]
+        self._open = {}             # lane -> stack of open span indices
+
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._on_stop = []
+
+    #---------- lifecycle
+    def start(self, thread_id=None):
+        """Start sampling `thread_id` (default: the calling thread)."""
+        self.thread_id = thread_id or threading.get_ident()
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.name}", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        while self._on_stop:
+            self._on_stop.pop()()
+        if self._sampler is not None:
+            self._stop_event.set()
+            self._sampler.join()
+            self._sampler = None
+        if self.stopped is None:
+            self.stopped = time.perf_counter()
+        return self
+
+    def now(self):
+        return time.perf_counter() - self.started
+
+    #---------- spans
+    @contextlib.contextmanager
+    def span(self, name, lane='main', **meta):
+        """Record a named interval; spans in the same lane must nest."""
+        index = len(self.spans)
+        self.spans.append({'name': name, 'lane': lane, 'start': self.now(), 'end': None, 'meta': meta})
+        stack = self._open.setdefault(lane, [])
+        stack.append(index)
+        try:
+            yield self.spans[index]
+        finally:
+            self.spans[index]['end'] = self.now()
+            stack.remove(index)
+
+    def _span_frames(self, lane='main'):
+        return [self._frame(('[' + self.spans[i]['name'] + ']', '', 0)) for i in list(self._open.get(lane, ()))]
+
+    #---------- sampling
+    def _frame(self, key):
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            stack.append(self._frame((code.co_name, code.co_filename, code.co_firstlineno)))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            tick = time.perf_counter()
+            weight, last = tick - last, tick
+            if self.sample_filter is not None and not self.sample_filter():
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = self._span_frames() + self._stack(frame)
+            self.samples.append((tick - self.started, stack, weight))
+
+    #---------- export
+    def _end_time(self):
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def span_summary(self):
+        """Total seconds and count per span name."""
+        end = self._end_time()
+        summary = {}
+        for span in list(self.spans):
+            entry = summary.setdefault(span['name'], {'count': 0, 'total': 0.0})
+            entry['count'] += 1
+            entry['total'] += (span['end'] if span['end'] is not None else end) - span['start']
+        for entry in summary.values():
+            entry['total'] = round(entry['total'], 6)
+        return summary
+
+    def timeline(self):
+        """Spans as plain dicts, unfinished spans ending now."""
+        end = self._end_time()
+        return [dict(span, end=span['end'] if span['end'] is not None else end) for span in list(self.spans)]
+
+    def to_speedscope(self):
+        """Speedscope file: one sampled profile plus one evented profile per span lane."""
+        end = self._end_time()
+        frames = list(self.frames)
+        samples = list(self.samples)
+        shared = [{'name': name, 'file': file, 'line': line} if file else {'name': name}
+                  for name, file, line in frames]
+
+        profiles = [{
+            'type': 'sampled',
+            'name': f"{self.name} (samples)",
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': end,
+            'samples': [stack for _, stack, _ in samples],
+            'weights': [weight for _, _, weight in samples],
+        }]
+
+        span_frames = {}
+        lanes = {}
+        for span in self.timeline():
+            lanes.setdefault(span['lane'], []).append(span)
+        for lane, spans in lanes.items():
+            events = []
+            open_spans = []
+            for span in sorted(spans, key=lambda s: (s['start'], -s['end'])):
+                while open_spans and open_spans[-1]['end'] <= span['start']:
+                    closed = open_spans.pop()
+                    events.append({'type': 'C', 'frame': span_frames[closed['name']], 'at': closed['end']})
+                if open_spans and span['end'] > open_spans[-1]['end']:
+                    # overlapping (e.g. concurrent) spans are clipped to keep events nested
+                    span = dict(span, end=open_spans[-1]['end'])
+                if span['name'] not in span_frames:
+                    span_frames[span['name']] = len(shared)
+                    shared.append({'name': span['name']})
+                events.append({'type': 'O', 'frame': span_frames[span['name']], 'at': span['start']})
+                open_spans.append(span)
+            while open_spans:
+                closed = open_spans.pop()
+                events.append({'type': 'C', 'frame': span_frames[closed['name']], 'at': closed['end']})
+            profiles.append({
+                'type': 'evented',
+                'name': f"{self.name} (spans: {lane})",
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': end,
+                'events': events,
+            })
+
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': self.name,
+            'exporter': 'code_review_agent profiling',
+            'activeProfileIndex': 0,
+            'shared': {'frames': shared},
+            'profiles': profiles,
+        }
+
+    def to_collapsed(self):
+        """Folded stacks ('a;b;c <microseconds>') for flamegraph.pl / inferno / speedscope."""
+        frames = list(self.frames)
+        folded = {}
+        for _, stack, weight in list(self.samples):
+            key = ';'.join(frames[i][0] if not frames[i][1] else
+                           f"{frames[i][0]} ({os.path.basename(frames[i][1])}:{frames[i][2]})"
+                           for i in stack)
+            folded[key] = folded.get(key, 0) + weight
+        return ''.join(f"{key} {max(1, round(weight * 1e6))}\n" for key, weight in sorted(folded.items()))
+
+    def save(self, path_prefix):
+        """Write `<prefix>.speedscope.json` and `<prefix>.folded`; returns both paths."""
+        os.makedirs(os.path.dirname(path_prefix) or '.', exist_ok=True)
+        speedscope_path, folded_path = path_prefix + '.speedscope.json', path_prefix + '.folded'
+        with open(speedscope_path, 'w') as f:
+            json.dump(self.to_speedscope(), f)
+        with open(folded_path, 'w') as f:
+            f.write(self.to_collapsed())
+        return speedscope_path, folded_path
+
+
+def trace_http(profiler):
+    """
+    Record every HTTP request sent from the profiled thread via `requests` or
+    `httpx` as an 'llm_wait' span. Returns a function that removes the hooks.
+    """
+    restorers = []
+
+    def traced(original):
+        def send(transport, request, *args, **kwargs):
+            if threading.get_ident() != profiler.thread_id:
+                return original(transport, request, *args, **kwargs)
+            with profiler.span('llm_wait', url=str(request.url)):
+                return original(transport, request, *args, **kwargs)
+        return send
+
+    try:
+        from requests.adapters import HTTPAdapter
+        original_send = HTTPAdapter.send
+        HTTPAdapter.send = traced(original_send)
+        restorers.append(lambda: setattr(HTTPAdapter, 'send', original_send))
+    except ImportError:
+        pass
+    try:
+        import httpx
+        original_handle = httpx.HTTPTransport.handle_request
+        httpx.HTTPTransport.handle_request = traced(original_handle)
+        restorers.append(lambda: setattr(httpx.HTTPTransport, 'handle_request', original_handle))
+    except ImportError:
+        pass
+
+    def restore():
+        for restorer in reversed(restorers):
+            restorer()
+    return restore
+
+
+def start_profile(args):
+    """Start profiling the calling thread into `args.profiler` if `--profile` is set."""
+    args.profiler = None
+    if getattr(args, 'profile', False):
+        args.profiler = Profiler(name=args.prefix or 'pr_review', interval=args.profile_interval).start()
+        args.profiler._on_stop.append(trace_http(args.profiler))
+    return args.profiler
+
+
+def finish_profile(args, logger=None):
+    """Stop the profiler started by `start_profile` and write it under `--profile_dir`."""
+    profiler = getattr(args, 'profiler', None)
+    if profiler is None:
+        return None
+    profiler.stop()
+    args.profiler = None
+    prefix = os.path.join(args.profile_dir, f"{profiler.name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    speedscope_path, folded_path = profiler.save(prefix)
+    if logger:
+        logger.info(f"Profile written to {speedscope_path} and {folded_path}")
+        logger.info(f"Profile spans: {profiler.span_summary()}")
+    return speedscope_path
+
+
+def add_profile_args(parser):
+    parser.add_argument("--profile", action="store_true", help="Capture a sampling profile and span timeline of the review")
+    parser.add_argument("--profile_dir", type=str, default="profiles", help="Directory for speedscope/folded profile files")
+    parser.add_argument("--profile_interval", type=float, default=DEFAULT_INTERVAL, help="Sampling interval in seconds")
+
+
+def span(args, name, **meta):
+    """`args.profiler.span(...)` when profiling is enabled, otherwise a no-op context."""
+    profiler = getattr(args, 'profiler', None)
+    return profiler.span(name, **meta) if profiler is not None else contextlib.nullcontext()
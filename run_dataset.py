@@ -0,0 +1,254 @@
+"""
+Sharded, resumable runner for evaluating the pipeline over a PR dataset.
+
+PRs are discovered as `<pr_id>_problem_statement.txt` files that have matching
+`_patch.txt` and `_test_patch.txt` files (see `load_pr_data`), and run through
+`main_worker` on a process pool. Per-PR results are appended to a JSONL file as
+they finish, so an interrupted run resumes where it stopped, and aggregate
+latency/routing/review metrics are written next to it.
+
+    python run_dataset.py --data_dir data/code_review_data --output results/run.jsonl \
+        --repo_root PR_repos --repo_path PR_repos/xarray --module_path xarray \
+        --workers 8 --shard 0/4
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import build_arg_parser, load_pr_data, main_worker
+from profiling import start_profile, finish_profile
+
+
+PROBLEM_SUFFIX = '_problem_statement.txt'
+
+# per-process state set by the pool initializer
+_worker_args = None
+_worker_token = None
+
+
+def discover_prs(data_dir):
+    """Return sorted [(pr_id, problem_statement_path)] for complete PR triples."""
+    prs = []
+    for path in sorted(glob.glob(os.path.join(data_dir, '*' + PROBLEM_SUFFIX))):
+        if not (os.path.exists(path.replace('problem_statement', 'patch'))
+                and os.path.exists(path.replace('problem_statement', 'test_patch'))):
+            continue
+        prs.append((os.path.basename(path)[:-len(PROBLEM_SUFFIX)], path))
+    return prs
+
+
+def parse_shard(spec):
+    """'i/N' -> (i, N)"""
+    index, _, count = spec.partition('/')
+    index, count = int(index), int(count)
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {spec}, expected i/N with 0 <= i < N")
+    return index, count
+
+
+def in_shard(pr_id, shard_index, shard_count):
+    # hash-based so adding PRs to the dataset does not reshuffle the shards
+    digest = hashlib.md5(pr_id.encode('utf-8')).hexdigest()
+    return int(digest, 16) % shard_count == shard_index
+
+
+def load_finished(output_path, retry_failed=False):
+    """PR ids already recorded in the output, optionally excluding failed ones."""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a run killed mid-write can leave a partial last line
+                continue
+            if retry_failed and record.get('status') != 'ok':
+                continue
+            finished.add(record['pr_id'])
+    return finished
+
+
+def _init_worker(args):
+    global _worker_args, _worker_token
+    _worker_args = args
+    if args.llm_cassette_mode != 'off':
+        import llm_cassette
+        path = args.llm_cassette
+        if args.llm_cassette_mode == 'record':
+            # one writer per cassette; the parent merges them when the run ends
+            path = llm_cassette.worker_cassette_path(path)
+        llm_cassette.install(path, args.llm_cassette_mode, args.replay_latency)
+    import genai_sample_util
+    _worker_token = genai_sample_util.get_genai_token()
+
+
+def run_one(pr_id, input_path):
+    """Run the pipeline on one PR and return its result record."""
+    from utils.logger import set_logger
+
+    args = type(_worker_args)(**vars(_worker_args))
+    args.input = input_path
+    args.prefix = f"{_worker_args.prefix}_{pr_id}" if _worker_args.prefix else pr_id
+    record = {'pr_id': pr_id, 'input': input_path, 'worker_pid': os.getpid()}
+
+    start = time.time()
+    try:
+        logger = set_logger(args)
+        pr_data = load_pr_data(input_path)
+        start_profile(args)
+        try:
+            send_back = main_worker(args, logger, pr_data, _worker_token)
+        finally:
+            profile_path = finish_profile(args, logger)
+            if profile_path:
+                record['profile'] = profile_path
+        record.update({
+            'status': 'ok',
+            'send_back': send_back,
+            'outcome': args.pr_outcome,
+            'model_tiers': getattr(args, 'model_tiers', {}),
+        })
+    except Exception as e:
+        record.update({'status': 'error', 'error': f"{type(e).__name__}: {e}"})
+    record['latency'] = round(time.time() - start, 3)
+    return record
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    position = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[position]
+
+
+def aggregate(records):
+    """Aggregate latency, routing and review metrics over result records."""
+    ok = [r for r in records if r.get('status') == 'ok']
+    latencies = [r['latency'] for r in ok]
+    routed = [r['outcome']['routing'] for r in ok if 'routing' in r.get('outcome', {})]
+    reviewed = [r['outcome']['review'] for r in ok if 'review' in r.get('outcome', {})]
+
+    escalations = {}
+    for r in ok:
+        for step, tier in r.get('model_tiers', {}).items():
+            counts = escalations.setdefault(step, {'answered': 0, 'escalated': 0})
+            counts['answered'] += 1
+            counts['escalated'] += int(tier.get('escalated', False))
+
+    return {
+        'total': len(records),
+        'ok': len(ok),
+        'errors': len(records) - len(ok),
+        'send_back_rate': (sum(bool(r['send_back']) for r in ok) / len(ok)) if ok else None,
+        'latency': {
+            'mean': (sum(latencies) / len(latencies)) if latencies else None,
+            'p50': _percentile(latencies, 0.5),
+            'p95': _percentile(latencies, 0.95),
+            'max': max(latencies) if latencies else None,
+        },
+        'routing': {
+            'routed': len(routed),
+            'easy': sum(bool(r['is_easy']) for r in routed),
+            'hard': sum(not r['is_easy'] for r in routed),
+        },
+        'review': {
+            'reviewed': len(reviewed),
+            'passed': sum(bool(r['overall_good']) for r in reviewed),
+            'failed': sum(not r['overall_good'] for r in reviewed),
+        },
+        'model_tiers': escalations,
+    }
+
+
+def read_records(output_path):
+    """Result records of the output, keeping only the last one of a retried PR."""
+    records = {}
+    if os.path.exists(output_path):
+        with open(output_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records.pop(record['pr_id'], None)
+                records[record['pr_id']] = record
+    return list(records.values())
+
+
+def write_parquet(records, path):
+    import pandas as pd
+
+    frame = pd.json_normalize(records, sep='.')
+    # nested structures (reasons, attempts) are kept as JSON strings
+    for column in frame.columns:
+        if frame[column].map(lambda value: isinstance(value, (list, dict))).any():
+            frame[column] = frame[column].map(json.dumps)
+    frame.to_parquet(path, index=False)
+
+
+if __name__ == "__main__":
+
+    parser = build_arg_parser(description="Run the review pipeline over a PR dataset.")
+    parser.add_argument("--data_dir", type=str, required=True, help="Directory with *_problem_statement.txt files")
+    parser.add_argument("--output", type=str, required=True, help="Per-PR results JSONL (appended, used to resume)")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--shard", type=str, default='0/1', help="Run only shard i of N, e.g. 2/8")
+    parser.add_argument("--limit", type=int, default=None, help="Run at most this many PRs")
+    parser.add_argument("--retry_failed", action="store_true", help="Re-run PRs whose previous run errored")
+    parser.add_argument("--parquet", type=str, help="Also export all results to this Parquet file")
+    args = parser.parse_args()
+    if args.llm_cassette_mode != 'off' and not args.llm_cassette:
+        parser.error(f"--llm_cassette_mode {args.llm_cassette_mode} requires --llm_cassette")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger('run_dataset')
+
+    shard_index, shard_count = parse_shard(args.shard)
+    prs = [(pr_id, path) for pr_id, path in discover_prs(args.data_dir)
+           if in_shard(pr_id, shard_index, shard_count)]
+    finished = load_finished(args.output, retry_failed=args.retry_failed)
+    pending = [(pr_id, path) for pr_id, path in prs if pr_id not in finished]
+    if args.limit is not None:
+        pending = pending[:args.limit]
+    logger.info(f"Shard {shard_index}/{shard_count}: {len(prs)} PRs, "
+                f"{len(prs) - len(pending)} already finished, {len(pending)} to run")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    start = time.time()
+    if pending:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(args,)) as pool, open(args.output, 'a') as out:
+            futures = {pool.submit(run_one, pr_id, path): pr_id for pr_id, path in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                logger.info(f"[{done}/{len(pending)}] {record['pr_id']}: {record['status']} "
+                            f"in {record['latency']:.1f}s")
+
+    if args.llm_cassette_mode == 'record' and args.llm_cassette:
+        import llm_cassette
+        worker_paths = llm_cassette.worker_cassettes(args.llm_cassette)
+        merged = llm_cassette.merge_cassettes(args.llm_cassette, worker_paths)
+        logger.info(f"Merged {len(worker_paths)} worker cassettes into {merged.path} ({len(merged.index)} keys)")
+
+    records = [r for r in read_records(args.output) if in_shard(r['pr_id'], shard_index, shard_count)]
+    summary = aggregate(records)
+    summary.update({'shard': args.shard, 'wall_time': round(time.time() - start, 3)})
+    summary_path = os.path.splitext(args.output)[0] + '.summary.json'
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    logger.info(f"Summary written to {summary_path}: {summary['ok']} ok, {summary['errors']} errors, "
+                f"p50 latency {summary['latency']['p50']}s")
+
+    if args.parquet:
+        write_parquet(records, args.parquet)
+        logger.info(f"Results exported to {args.parquet}")